@@ -1,6 +1,8 @@
 from flask import (
     Flask,
+    g,
     jsonify,
+    make_response,
     render_template,
     request,
     redirect,
@@ -12,71 +14,49 @@ from flask import (
 from flask_session import Session
 from cachelib.file import FileSystemCache
 
-import jsonschema
-import requests
+import hashlib
 import io
-from ruamel.yaml import YAML
+import json
 import os
 from dotenv import load_dotenv
-from pathlib import Path
-from plexapi.server import PlexServer
-import pyfiglet
-import secrets
-import namesgenerator
-
-import string
-import random
-
-from modules.validations import (
-    validate_iso3166_1,
-    validate_iso639_1,
-    validate_plex_server,
-    validate_tautulli_server,
-    validate_trakt_server,
-    validate_mal_server,
-    validate_anidb_server,
-    validate_gotify_server,
-    validate_webhook_server,
-    validate_radarr_server,
-    validate_sonarr_server,
-    validate_omdb_server,
-    validate_github_server,
-    validate_tmdb_server,
-    validate_mdblist_server,
-    validate_notifiarr_server,
-)
-from modules.output import build_config
-from modules.helpers import get_template_list, get_bits, get_menu_list
+import time
+
+# Heavy dependencies (plexapi, pyfiglet, jsonschema, namesgenerator and
+# modules.validations with iso639/iso3166) are imported inside the routes
+# that need them, so workers start serving without paying for them up front.
+from modules.output import HEADER_STYLES, get_config_artifacts
+from modules.helpers import get_step_registry
 from modules.persistence import (
     save_settings,
     retrieve_settings,
     check_minimum_settings,
     flush_session_storage,
     notification_systems_available,
+    section_cache_stats,
+)
+from modules.database import (
+    reset_data,
+    close_connection,
+    migrate_section_data,
+)
+from modules.schema import schema_info, start_schema_refresh
+from modules.migrations import migrate_database
+from modules.preload import preload_shared_data
+from modules.logs import (
+    configure_logging,
+    get_logger,
+    request_timings,
+    server_timing_header,
+    timed,
 )
-from modules.database import reset_data
 
 basedir = os.path.abspath
 
-# Load JSON Schema
-yaml = YAML(typ="safe", pure=True)
-
-# URL to the JSON schema
-url = "https://raw.githubusercontent.com/Kometa-Team/Kometa/nightly/json-schema/config-schema.json"
-
-try:
-    # Fetch the schema
-    response = requests.get(url)
-    response.raise_for_status()  # Ensure we notice bad responses
-
-    # Load the schema
-    schema = yaml.load(response.text)
-except requests.RequestException as e:
-    print(f"Error fetching the JSON schema: {e}")
-    schema = None  # or handle the error appropriately
-
 load_dotenv()
 
+configure_logging()
+logger = get_logger(__name__)
+
 app = Flask(__name__)
 
 app.config["SESSION_TYPE"] = "cachelib"
@@ -88,6 +68,68 @@ app.config["SESSION_USE_SIGNER"] = False
 
 server_session = Session(app)
 
+# each request reuses one SQLite connection, closed when its app context ends
+app.teardown_appcontext(close_connection)
+
+# schema changes happen here, once, rather than as DDL on every query
+migrate_database()
+
+# the wizard's steps are fixed for the life of the process (outside debug mode)
+with app.app_context():
+    get_step_registry()
+
+if os.environ.get("QUICKSTART_PRELOADED"):
+    # Loaded once in the gunicorn master (see gunicorn.conf.py): build the
+    # read-only data now so the forked workers share it. The schema refresh
+    # is started in each worker instead, as threads do not survive the fork.
+    preload_shared_data(app)
+else:
+    # Fetch any newer schema in the background; everything else is built
+    # on first use
+    start_schema_refresh()
+
+logger.info(
+    "Using {source} JSON schema {version} ({age_seconds}s old) in process {pid}".format(
+        **schema_info()
+    )
+)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def report_request_timings(response):
+    timings = request_timings()
+    if "request_started" in g:
+        timings["total"] = (time.perf_counter() - g.request_started) * 1000
+    if timings:
+        response.headers["Server-Timing"] = server_timing_header(timings)
+
+    fields = {}
+    cache_stats = section_cache_stats()["request"]
+    if cache_stats["hits"] or cache_stats["misses"]:
+        fields["section_cache_hits"] = cache_stats["hits"]
+        fields["section_cache_misses"] = cache_stats["misses"]
+
+    logger.info(
+        "%s %s %s",
+        request.method,
+        request.path,
+        response.status_code,
+        extra={"fields": fields, "timings": timings},
+    )
+    return response
+
+
+@app.cli.command("migrate-section-data")
+def migrate_section_data_command():
+    """Convert pickled rows in config/quickstart.sqlite to the current format."""
+    converted, skipped = migrate_section_data()
+    print(f"Converted {converted} section(s); skipped {skipped} unreadable one(s).")
+
 
 @app.route("/update_libraries", methods=["POST"])
 def update_libraries():
@@ -102,6 +144,23 @@ def update_libraries():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/schema_status")
+def schema_status():
+    return jsonify(schema_info())
+
+
+@app.route("/section_cache_status")
+def section_cache_status():
+    return jsonify(section_cache_stats())
+
+
+@app.route("/upstream_status")
+def upstream_status():
+    from modules.upstream import pool_stats
+
+    return jsonify(pool_stats())
+
+
 @app.route("/")
 def start():
     return redirect(url_for("step", name="001-start"))
@@ -137,48 +196,40 @@ def step(name):
         save_settings(request.referrer, request.form)
         header_style = request.form.get("header_style", "ascii")
 
+    import namesgenerator
+
     try:
         if not session["config_name"]:
             session["config_name"] = namesgenerator.get_random_name()
-        else:
-            print(f"There's a config name in the session")
     except:
         session["config_name"] = namesgenerator.get_random_name()
 
-    print(f"using config name: {session['config_name']}")
+    logger.debug("using config name: %s", session["config_name"])
 
     page_info["config_name"] = session["config_name"]
     page_info["header_style"] = header_style
     page_info["template_name"] = name
 
-    file_list = get_menu_list()
-
-    template_list = get_template_list()
+    registry = get_step_registry()
 
-    total_steps = len(template_list)
+    file_list = registry.menu
 
-    stem, num, b = get_bits(name)
+    item = registry.by_stem.get(name)
 
-    current_index = -1
-    item = None
-
-    try:
-        current_index = list(template_list).index(num)
-        item = template_list[num]
-    except:
+    if item is None:
         # not in there
-        return f"ERROR WITH NAME {name}; stem, num, b: {stem}, {num}, {b}"
+        return f"ERROR WITH NAME {name}"
 
-    page_info["progress"] = round((current_index + 1) / total_steps * 100)
+    page_info["progress"] = registry.progress(item)
 
-    page_info["title"] = item["name"]
-    page_info["next_page"] = item["next"]
-    page_info["prev_page"] = item["prev"]
+    page_info["title"] = item.name
+    page_info["next_page"] = item.next
+    page_info["prev_page"] = item.prev
 
     data = retrieve_settings(name)
     plex_data = retrieve_settings("010-plex")
 
-    print(f"data retrieved for {name}")
+    logger.debug("data retrieved for %s", name)
 
     page_info["plex_valid"], page_info["tmdb_valid"] = check_minimum_settings()
 
@@ -188,162 +239,266 @@ def step(name):
 
     # This should not be based on name; maybe next being empty
     if name == "900-final":
-        validated, validation_error, config_data, yaml_content = build_config(
-            header_style
-        )
-
-        page_info["yaml_valid"] = validated
-
-        return render_template(
-            "900-final.html",
-            page_info=page_info,
-            data=data,
-            yaml_content=yaml_content,
-            validation_error=validation_error,
-            template_list=file_list,
-        )
+        if header_style not in HEADER_STYLES:
+            header_style = page_info["header_style"] = "ascii"
+
+        # every header style comes from one build, so switching between them
+        # on the page doesn't need a round trip
+        artifacts = get_config_artifacts()
+        artifact = artifacts[header_style]
+
+        page_info["yaml_valid"] = artifact["validated"]
+
+        # the page is fully determined by the rendered configs, what they were
+        # rendered from and page_info, so back-navigation can get a 304
+        etag = hashlib.sha256(
+            json.dumps(
+                [
+                    # a deploy (or, in debug mode, an edit) changing a
+                    # template must not be answered with a 304
+                    registry.templates_version,
+                    sorted(a["digest"] for a in artifacts.values()),
+                    artifact["inputs"],
+                    page_info,
+                ],
+                sort_keys=True,
+                default=str,
+            ).encode("utf-8")
+        ).hexdigest()
+
+        # pending flash messages would be lost on a 304
+        if (
+            request.method == "GET"
+            and "_flashes" not in session
+            and request.if_none_match.contains(etag)
+        ):
+            response = app.response_class(status=304)
+        else:
+            with timed("render"):
+                response = make_response(
+                    render_template(
+                        "900-final.html",
+                        page_info=page_info,
+                        data=data,
+                        yaml_content=artifact["content"],
+                        yaml_variants={
+                            style: a["content"] for style, a in artifacts.items()
+                        },
+                        validation_error=artifact["validation_error"],
+                        template_list=file_list,
+                    )
+                )
+
+        response.set_etag(etag)
+        # always revalidate rather than show a stale config
+        response.cache_control.no_cache = True
+        return response
 
     else:
-        return render_template(
-            name + ".html",
-            page_info=page_info,
-            data=data,
-            plex_data=plex_data,
-            template_list=file_list,
-        )
+        plex_snapshot = None
+        if name == "015-library_selection" and plex_data["plex"]:
+            from modules.plex_discovery import cached_plex_snapshot
+
+            # libraries as of the last validation in this worker, if recent;
+            # otherwise the page falls back to what was saved with 010-plex
+            plex_snapshot = cached_plex_snapshot(
+                plex_data["plex"].get("url"), plex_data["plex"].get("token")
+            )
+
+        with timed("render"):
+            return render_template(
+                name + ".html",
+                page_info=page_info,
+                data=data,
+                plex_data=plex_data,
+                plex_snapshot=plex_snapshot,
+                template_list=file_list,
+            )
 
 
 @app.route("/download")
 def download():
-    yaml_content = session.get("yaml_content", "")
-    if yaml_content:
-        return send_file(
-            io.BytesIO(yaml_content.encode("utf-8")),
+    header_style = request.args.get("style", "ascii")
+    if header_style not in HEADER_STYLES:
+        flash(f"Unknown header style: {header_style}", "danger")
+        return redirect(url_for("step", name="900-final"))
+
+    if session.get("config_name"):
+        artifact = get_config_artifacts()[header_style]
+        content = artifact["content"].encode("utf-8")
+        response = send_file(
+            io.BytesIO(content),
             mimetype="text/yaml",
             as_attachment=True,
             download_name="config.yml",
+            etag=artifact["digest"],
+            max_age=0,
         )
+        response.content_length = len(content)
+        return response
     flash("No configuration to download", "danger")
-    return redirect(url_for("final_step"))
+    return redirect(url_for("step", name="900-final"))
+
+
+def start_validation(service, validator, invalid_status=None, data=None):
+    from modules.jobs import JobQueueFull, submit_validation
+
+    try:
+        job_id = submit_validation(
+            service,
+            validator,
+            request.json if data is None else data,
+            invalid_status=invalid_status,
+        )
+    except JobQueueFull as e:
+        return jsonify({"valid": False, "error": f"Try again shortly: {e}"}), 503
+
+    return (
+        jsonify(
+            {
+                "job_id": job_id,
+                "status": "pending",
+                "status_url": url_for("validation_job", job_id=job_id),
+            }
+        ),
+        202,
+    )
+
+
+@app.route("/validation_cache_status")
+def validation_cache_status():
+    from modules.validations import validation_cache_stats
+
+    return jsonify(validation_cache_stats())
+
+
+@app.route("/validation_jobs/<job_id>")
+def validation_job(job_id):
+    from modules.jobs import validation_job_status
+
+    job = validation_job_status(job_id)
+    if job is None:
+        return jsonify({"error": f"No such validation job: {job_id}"}), 404
+    return jsonify(job)
 
 
 @app.route("/validate_gotify", methods=["POST"])
 def validate_gotify():
-    data = request.json
-    return validate_gotify_server(data)
+    from modules.validations import validate_gotify_server
+
+    return start_validation("gotify", validate_gotify_server)
 
 
 @app.route("/validate_plex", methods=["POST"])
 def validate_plex():
-    data = request.json
-    return validate_plex_server(data)
+    from modules.validations import validate_plex_server
+
+    return start_validation("plex", validate_plex_server)
+
+
+@app.route("/validate_all", methods=["POST"])
+def validate_all():
+    from modules.validations import validate_all_sections
+
+    if not session.get("config_name"):
+        return jsonify({"valid": False, "error": "No configuration to validate"}), 400
+
+    # the job has no session of its own, so it's told which config to check
+    return start_validation(
+        "all", validate_all_sections, data={"config_name": session["config_name"]}
+    )
+
+
+@app.route("/plex_users", methods=["POST"])
+def plex_users():
+    from modules.validations import fetch_plex_users
+
+    # from plex.tv, so loaded after (and apart from) validating the server
+    return start_validation("plex_users", fetch_plex_users)
 
 
 @app.route("/validate_tautulli", methods=["POST"])
 def validate_tautulli():
-    data = request.json
-    return validate_tautulli_server(data)
+    from modules.validations import validate_tautulli_server
+
+    return start_validation("tautulli", validate_tautulli_server)
 
 
 @app.route("/validate_trakt", methods=["POST"])
 def validate_trakt():
-    data = request.json
-    return validate_trakt_server(data)
+    from modules.validations import validate_trakt_server
+
+    return start_validation("trakt", validate_trakt_server)
 
 
 @app.route("/validate_mal", methods=["POST"])
 def validate_mal():
-    data = request.json
-    return validate_mal_server(data)
+    from modules.validations import validate_mal_server
+
+    return start_validation("mal", validate_mal_server)
 
 
 @app.route("/validate_anidb", methods=["POST"])
 def validate_anidb():
-    data = request.json
-    return validate_anidb_server(data)
+    from modules.validations import validate_anidb_server
+
+    return start_validation("anidb", validate_anidb_server)
 
 
 @app.route("/validate_webhook", methods=["POST"])
 def validate_webhook():
-    data = request.json
-    return validate_webhook_server(data)
+    from modules.validations import validate_webhook_server
+
+    return start_validation("webhook", validate_webhook_server)
 
 
 @app.route("/validate_radarr", methods=["POST"])
 def validate_radarr():
-    data = request.json
-    result = validate_radarr_server(data)
+    from modules.validations import validate_radarr_server
 
-    if result.get_json().get("valid"):
-        return jsonify(result.get_json())
-    else:
-        return jsonify(result.get_json()), 400
+    return start_validation("radarr", validate_radarr_server, invalid_status=400)
 
 
 @app.route("/validate_sonarr", methods=["POST"])
 def validate_sonarr():
-    data = request.json
-    result = validate_sonarr_server(data)
+    from modules.validations import validate_sonarr_server
 
-    if result.get_json().get("valid"):
-        return jsonify(result.get_json())
-    else:
-        return jsonify(result.get_json()), 400
+    return start_validation("sonarr", validate_sonarr_server, invalid_status=400)
 
 
 @app.route("/validate_omdb", methods=["POST"])
 def validate_omdb():
-    data = request.json
-    result = validate_omdb_server(data)
+    from modules.validations import validate_omdb_server
 
-    if result.get_json().get("valid"):
-        return jsonify(result.get_json())
-    else:
-        return jsonify(result.get_json()), 400
+    return start_validation("omdb", validate_omdb_server, invalid_status=400)
 
 
 @app.route("/validate_github", methods=["POST"])
 def validate_github():
-    data = request.json
-    result = validate_github_server(data)
+    from modules.validations import validate_github_server
 
-    if result.get_json().get("valid"):
-        return jsonify(result.get_json())
-    else:
-        return jsonify(result.get_json()), 400
+    return start_validation("github", validate_github_server, invalid_status=400)
 
 
 @app.route("/validate_tmdb", methods=["POST"])
 def validate_tmdb():
-    data = request.json
-    result = validate_tmdb_server(data)
+    from modules.validations import validate_tmdb_server
 
-    if result.get_json().get("valid"):
-        return jsonify(result.get_json())
-    else:
-        return jsonify(result.get_json()), 400
+    return start_validation("tmdb", validate_tmdb_server, invalid_status=400)
 
 
 @app.route("/validate_mdblist", methods=["POST"])
 def validate_mdblist():
-    data = request.json
-    result = validate_mdblist_server(data)
+    from modules.validations import validate_mdblist_server
 
-    if result.get_json().get("valid"):
-        return jsonify(result.get_json())
-    else:
-        return jsonify(result.get_json()), 400
+    return start_validation("mdblist", validate_mdblist_server, invalid_status=400)
 
 
 @app.route("/validate_notifiarr", methods=["POST"])
 def validate_notifiarr():
-    data = request.json
-    result = validate_notifiarr_server(data)
+    from modules.validations import validate_notifiarr_server
 
-    if result.get_json().get("valid"):
-        return jsonify(result.get_json())
-    else:
-        return jsonify(result.get_json()), 400
+    return start_validation("notifiarr", validate_notifiarr_server, invalid_status=400)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+import gc
+import os
+
+# Load app.py once in the master so the schema, ISO tables, prototype config
+# and step registry are built before forking and shared copy-on-write.
+# Set QUICKSTART_PRELOAD=false to have every worker load its own copy.
+preload_app = os.environ.get("QUICKSTART_PRELOAD", "true").lower() != "false"
+
+if preload_app:
+    os.environ["QUICKSTART_PRELOADED"] = "1"
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+
+    from modules.schema import get_validator
+
+    # compiled once here rather than in every worker on its first final page
+    get_validator()
+
+    # Move everything built so far out of the collector's reach; otherwise a
+    # collection in a worker writes to the GC headers of these objects and
+    # un-shares the pages they live on.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from modules.schema import start_schema_refresh
+
+        start_schema_refresh()
@@ -0,0 +1,204 @@
+import re
+
+from .schema import get_schema, get_schema_version
+
+# Sections whose credentials come back from an OAuth exchange; everything
+# but the client details and pin is nested under `authorization`
+OAUTH_SECTIONS = ("trakt", "mal")
+OAUTH_CLIENT_FIELDS = ("client_id", "client_secret", "pin")
+
+BOOLEAN_WORDS = {"true": True, "on": True, "false": False}
+INTEGER_PATTERN = re.compile(r"[-+]?\d+")
+NUMBER_PATTERN = re.compile(r"[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?")
+LIST_SEPARATOR_PATTERN = re.compile(r"[\s,]+")
+
+DEFAULT_RUN_ORDER = ["operations", "metadata", "collections", "overlays"]
+
+# (schema version, {section: {field path: FieldSpec}}), built on first use
+_section_specs = None
+
+
+class FieldSpec:
+    """What the schema allows for one field of a section."""
+
+    __slots__ = ("types", "enum", "enum_lookup", "default", "items")
+
+    def __init__(self, types, enum=None, default=None, items=None):
+        self.types = types
+        self.enum = enum
+        # submitted text (lowercased) -> the enum value it names
+        self.enum_lookup = (
+            {str(option).lower(): option for option in enum} if enum else None
+        )
+        self.default = default
+        self.items = items
+
+    def __repr__(self):
+        return f"FieldSpec({sorted(self.types)!r}, enum={self.enum!r})"
+
+
+# Used for anything the schema doesn't describe (validated, tmp_*, the
+# library selection, ...): the same guesses the form handling always made
+UNKNOWN_FIELD = FieldSpec(frozenset(("boolean", "integer", "string")))
+VALIDATED_FIELD = FieldSpec(frozenset(("boolean",)))
+
+
+def resolve(node, definitions):
+    while "$ref" in node:
+        node = definitions[node["$ref"].rsplit("/", 1)[-1]]
+    return node
+
+
+def node_types(node, definitions):
+    node = resolve(node, definitions)
+
+    types = node.get("type")
+    if isinstance(types, str):
+        return {types}
+    if types:
+        return set(types)
+
+    found = set()
+    for keyword in ("oneOf", "anyOf", "allOf"):
+        for branch in node.get(keyword, []):
+            found |= node_types(branch, definitions)
+
+    for value in node.get("enum", []):
+        if isinstance(value, bool):
+            found.add("boolean")
+        elif isinstance(value, int):
+            found.add("integer")
+        elif isinstance(value, str):
+            found.add("string")
+        elif value is None:
+            found.add("null")
+
+    return found
+
+
+def field_spec(node, definitions):
+    node = resolve(node, definitions)
+
+    enum = node.get("enum")
+    items = None
+    if "items" in node:
+        items = field_spec(node["items"], definitions)
+
+    return FieldSpec(
+        frozenset(node_types(node, definitions)),
+        enum=tuple(enum) if enum else None,
+        default=node.get("default"),
+        items=items,
+    )
+
+
+def collect_fields(node, definitions, prefix, specs):
+    node = resolve(node, definitions)
+    for name, child in node.get("properties", {}).items():
+        path = prefix + name
+        child = resolve(child, definitions)
+        specs[path] = field_spec(child, definitions)
+        if "properties" in child:
+            collect_fields(child, definitions, path + ".", specs)
+
+
+def build_section_specs(schema):
+    """Map each top-level section of the schema to {field path: FieldSpec}."""
+    definitions = schema.get("definitions", {})
+    sections = {}
+    for section, node in schema.get("properties", {}).items():
+        specs = {}
+        collect_fields(node, definitions, "", specs)
+        sections[section] = specs
+    return sections
+
+
+def get_section_specs():
+    global _section_specs
+    version = get_schema_version()
+
+    cached = _section_specs
+    if cached is None or cached[0] != version:
+        cached = (version, build_section_specs(get_schema()))
+        _section_specs = cached
+
+    return cached[1]
+
+
+def coerce_value(value, spec):
+    """
+    Turn a submitted form value into the type the schema expects.
+
+    An empty field takes the schema's default, if it has one. A value naming
+    one of the field's enum options becomes that option as the schema spells
+    it; anything else is converted by type and otherwise kept as submitted,
+    for the schema validation to report.
+    """
+    if not isinstance(value, str):
+        return value
+
+    stripped = value.strip()
+    lowered = stripped.lower()
+    if not stripped:
+        return spec.default
+    if lowered == "none":
+        return None
+
+    if spec.enum_lookup is not None and lowered in spec.enum_lookup:
+        return spec.enum_lookup[lowered]
+
+    types = spec.types or UNKNOWN_FIELD.types
+
+    if "boolean" in types and lowered in BOOLEAN_WORDS:
+        return BOOLEAN_WORDS[lowered]
+    if "integer" in types and INTEGER_PATTERN.fullmatch(stripped):
+        return int(stripped)
+    if "number" in types and NUMBER_PATTERN.fullmatch(stripped):
+        return float(stripped)
+    if "array" in types and "string" not in types:
+        item_spec = spec.items or UNKNOWN_FIELD
+        return [
+            coerce_value(item, item_spec)
+            for item in LIST_SEPARATOR_PATTERN.split(stripped)
+            if item
+        ]
+
+    return value
+
+
+def coerce_form(section, form_data):
+    """
+    Build a section's stored data from a submitted form in one pass.
+
+    Form keys are `<section>_<field>` (or bare field names); each value is
+    converted using the schema's type for that field, so what is saved is
+    already typed and the output stage can dump it as-is.
+    """
+    specs = get_section_specs().get(section, {})
+    oauth = section in OAUTH_SECTIONS
+
+    data = {section: {"authorization": {}} if oauth else {}}
+    for key in form_data:
+        final_key = key.replace(section + "_", "", 1)
+        value = form_data[key]
+
+        if final_key == "validated":
+            data[final_key] = coerce_value(value, VALIDATED_FIELD)
+        elif not oauth:
+            data[section][final_key] = coerce_value(
+                value, specs.get(final_key, UNKNOWN_FIELD)
+            )
+        elif final_key in OAUTH_CLIENT_FIELDS:
+            data[section][final_key] = coerce_value(
+                value, specs.get(final_key, UNKNOWN_FIELD)
+            )
+        elif final_key != "url":
+            data[section]["authorization"][final_key] = coerce_value(
+                value, specs.get("authorization." + final_key, UNKNOWN_FIELD)
+            )
+
+    # An empty run order means the default one
+    if "run_order" in data[section] and data[section]["run_order"] is None:
+        data[section]["run_order"] = list(DEFAULT_RUN_ORDER)
+
+    return data
@@ -1,8 +1,20 @@
 import datetime
+import json
 import os
 import sqlite3
-import pickle
+import time
+from contextlib import contextmanager
+from flask import g, has_app_context
 from .helpers import booler
+from .logs import get_logger, timed
+from .serialization import (
+    SectionDataError,
+    decode_section_data,
+    encode_section_data,
+    is_legacy_section_data,
+)
+
+logger = get_logger(__name__)
 
 # Determine the root path of the project directory
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -11,141 +23,469 @@ DATABASE_PATH = os.path.join(CONFIG_DIR, "quickstart.sqlite")
 # Ensure the config directory exists
 os.makedirs(CONFIG_DIR, exist_ok=True)
 
+# How long a connection waits on another worker's write lock before giving up
+BUSY_TIMEOUT_MS = 5000
+
+
+def open_connection():
+    sqliteConnection = sqlite3.connect(
+        DATABASE_PATH,
+        detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+    )
+
+    # WAL mode itself is persistent and set by the migrations; NORMAL is
+    # durable enough in WAL mode and skips an fsync per commit
+    sqliteConnection.execute("PRAGMA synchronous=NORMAL")
+    sqliteConnection.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+
+    return sqliteConnection
+
+
+@contextmanager
+def database_connection():
+    """
+    Yield the connection for the current request, opening it on first use.
+
+    Inside an app context the connection lives on `flask.g` and is closed by
+    `close_connection` when the context ends; outside one (scripts, the
+    shell) a connection is opened and closed around the block.
+    """
+    if has_app_context():
+        if "sqlite_connection" not in g:
+            g.sqlite_connection = open_connection()
+        yield g.sqlite_connection
+    else:
+        sqliteConnection = open_connection()
+        try:
+            yield sqliteConnection
+        finally:
+            sqliteConnection.close()
+
+
+def close_connection(exception=None):
+    try:
+        flush_pending_sections()
+    finally:
+        sqliteConnection = g.pop("sqlite_connection", None)
+        if sqliteConnection is not None:
+            sqliteConnection.close()
+
+
+def upsert_section_query():
+    # Rows whose flags and data are unchanged are left alone, so repeated
+    # saves of the same form (e.g. clicking through Jump To) don't rewrite
+    # the row or bump updated_at, whichever worker they land on.
+    return """INSERT INTO section_data
+                  (name, section, validated, user_entered, data, created_at, updated_at)
+                  VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+              ON CONFLICT (name, section) DO UPDATE SET
+                  validated = excluded.validated,
+                  user_entered = excluded.user_entered,
+                  data = excluded.data,
+                  updated_at = excluded.updated_at
+              WHERE validated IS NOT excluded.validated
+                 OR user_entered IS NOT excluded.user_entered
+                 OR data IS NOT excluded.data;"""
+
+
+def save_sections(name, sections):
+    """
+    Save several sections of a config in one transaction.
+
+    `sections` maps section to a (validated, user_entered, data) tuple, the
+    same shape `retrieve_all_sections` returns.
+    """
+    if not sections:
+        return
 
-def persisted_section_table_create():
-    return """CREATE TABLE IF NOT EXISTS section_data (
-                                        name TEXT NOT NULL,
-                                        section TEXT NOT NULL,
-                                        validated BOOLEAN NOT NULL,
-                                        user_entered BOOLEAN NOT NULL,
-                                        data TEXT,
-                                        PRIMARY KEY (name, section)
-                                        );"""
+    try:
+        with database_connection() as sqliteConnection, timed("db-write"):
+            # commits on success, rolls back on error
+            with sqliteConnection:
+                sqliteConnection.executemany(
+                    upsert_section_query(),
+                    [
+                        (
+                            name,
+                            section,
+                            validated,
+                            user_entered,
+                            encode_section_data(data),
+                        )
+                        for section, (validated, user_entered, data) in sections.items()
+                    ],
+                )
+
+    except sqlite3.Error as error:
+        logger.error("Error while working with SQLite: %s", error)
 
 
 def save_section_data(section, validated, user_entered, data, name="default"):
+    """
+    Save a section, deferring the write until the end of the request.
+
+    Within a request, repeated saves of a section are coalesced and all
+    pending sections of a config are written in one transaction, either
+    before anything is next read back or when the app context ends. The
+    buffer never outlives the request: gunicorn workers don't share memory,
+    and the next request may well land on another one.
+    """
+    if not has_app_context():
+        save_sections(name, {section: (validated, user_entered, data)})
+        return
+
+    pending = g.setdefault("pending_sections", {})
+    pending.setdefault(name, {})[section] = (validated, user_entered, data)
+
+
+def flush_pending_sections():
+    if not has_app_context():
+        return
+
+    pending = g.pop("pending_sections", None)
+    if pending:
+        for name, sections in pending.items():
+            save_sections(name, sections)
+
+
+def retrieve_all_sections(name):
+    """
+    Return every stored section of a config in one query.
+
+    The result maps section to a (validated, user_entered, data) tuple.
+    """
+    flush_pending_sections()
+
+    sections = {}
+
     try:
-        sqliteConnection = sqlite3.connect(
-            DATABASE_PATH,
-            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
-        )
+        with database_connection() as sqliteConnection, timed("db-read"):
+            sqlite_select_query = """SELECT section, validated, user_entered, data from section_data where name == ?"""
 
-        cursor = sqliteConnection.cursor()
+            records = sqliteConnection.execute(sqlite_select_query, (name,)).fetchall()
 
-        sqlite_create_table_query = persisted_section_table_create()
+            for section, validated, user_entered, blob in records:
+                try:
+                    data = decode_section_data(blob)
+                except SectionDataError as error:
+                    logger.warning(
+                        "Ignoring stored data for %s/%s: %s", name, section, error
+                    )
+                    data = None
 
-        cursor = sqliteConnection.cursor()
+                sections[section] = (booler(validated), booler(user_entered), data)
 
-        cursor.execute(sqlite_create_table_query)
+    except sqlite3.Error as error:
+        logger.error("Error while working with SQLite: %s", error)
 
-        # insert a new record or ignore an existing record
-        sqlite_insert_with_param = """INSERT OR IGNORE INTO 'section_data'
-                          ('name', 'section', 'validated', 'user_entered', 'data')
-                          VALUES (?, ?, ?, ?, ?);"""
+    return sections
 
-        pickled_data = pickle.dumps(data)
 
-        data_tuple = (name, section, validated, user_entered, pickled_data)
+def save_config_artifacts(name, artifacts):
+    """
+    Store rendered configs, replacing older renders in the same header styles.
 
-        cursor.execute(sqlite_insert_with_param, data_tuple)
+    `artifacts` are dicts shaped like the values `retrieve_config_artifacts`
+    returns. Their content never changes for a given digest; re-saving one
+    only records the inputs it was most recently rendered from.
+    """
+    artifacts = list(artifacts)
+    if not artifacts:
+        return
 
-        # update an existing record
-        sqlite_update_with_param = """UPDATE 'section_data'
-                          SET 'validated' = ?,
-                          'user_entered' = ?,
-                          'data' = ?
-                          WHERE name == ? AND
-                          section == ?;"""
+    try:
+        with database_connection() as sqliteConnection, timed("db-write"):
+            with sqliteConnection:
+                sqliteConnection.executemany(
+                    """INSERT INTO config_artifacts
+                              (name, digest, header_style, inputs, content, validated, validation_error, created_at)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                          ON CONFLICT (name, digest) DO UPDATE SET
+                              inputs = excluded.inputs,
+                              validated = excluded.validated,
+                              validation_error = excluded.validation_error,
+                              created_at = excluded.created_at;""",
+                    [
+                        (
+                            name,
+                            artifact["digest"],
+                            artifact["header_style"],
+                            artifact["inputs"],
+                            artifact["content"],
+                            artifact["validated"],
+                            artifact["validation_error"],
+                        )
+                        for artifact in artifacts
+                    ],
+                )
+                sqliteConnection.executemany(
+                    """DELETE from config_artifacts
+                       where name == ? AND header_style == ? AND digest != ?""",
+                    [
+                        (name, artifact["header_style"], artifact["digest"])
+                        for artifact in artifacts
+                    ],
+                )
 
-        data_tuple = (validated, user_entered, pickled_data, name, section)
+    except sqlite3.Error as error:
+        logger.error("Error while working with SQLite: %s", error)
 
-        cursor.execute(sqlite_update_with_param, data_tuple)
 
-        sqliteConnection.commit()
+def retrieve_config_artifacts(name, inputs):
+    """
+    Return the stored renders of a config made from exactly `inputs`.
 
-        cursor.close()
+    Maps header style to a dict of digest, header_style, inputs, content,
+    validated and validation_error.
+    """
+    artifacts = {}
+
+    try:
+        with database_connection() as sqliteConnection, timed("db-read"):
+            sqlite_select_query = """SELECT digest, header_style, inputs, content, validated, validation_error
+                                     from config_artifacts where name == ? AND inputs == ?"""
+
+            records = sqliteConnection.execute(
+                sqlite_select_query, (name, inputs)
+            ).fetchall()
+
+            for (
+                digest,
+                header_style,
+                inputs,
+                content,
+                validated,
+                validation_error,
+            ) in records:
+                artifacts[header_style] = {
+                    "digest": digest,
+                    "header_style": header_style,
+                    "inputs": inputs,
+                    "content": content,
+                    "validated": booler(validated),
+                    "validation_error": validation_error,
+                }
 
     except sqlite3.Error as error:
-        print("Error while working with SQLite", error)
-    finally:
-        if sqliteConnection:
-            sqliteConnection.close()
+        logger.error("Error while working with SQLite: %s", error)
+
+    return artifacts
 
 
-def retrieve_section_data(name, section):
-    sqliteConnection = None  # Initialize the sqliteConnection variable
+def save_validation_job(job_id, service, deadline, retention):
+    """Record a newly submitted validation job, dropping ones older than `retention` seconds."""
+    now = time.time()
+
     try:
-        try:
-            sqliteConnection = sqlite3.connect(
-                DATABASE_PATH,
-                detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
-            )
-        except sqlite3.Error as error:
-            print("Error while connecting to SQLite", error)
-            return False, False, None
+        with database_connection() as sqliteConnection, timed("db-write"):
+            with sqliteConnection:
+                sqliteConnection.execute(
+                    """DELETE from validation_jobs where created_at < ?""",
+                    (now - retention,),
+                )
+                sqliteConnection.execute(
+                    """INSERT INTO validation_jobs (id, service, status, deadline, created_at)
+                              VALUES (?, ?, 'pending', ?, ?)""",
+                    (job_id, service, now + deadline, now),
+                )
 
-        cursor = sqliteConnection.cursor()
+    except sqlite3.Error as error:
+        logger.error("Error while working with SQLite: %s", error)
+        raise
 
-        sqlite_create_table_query = persisted_section_table_create()
 
-        cursor = sqliteConnection.cursor()
-        cursor.execute(sqlite_create_table_query)
+def update_validation_job(job_id, status, status_code=None, result=None):
+    try:
+        with database_connection() as sqliteConnection, timed("db-write"):
+            with sqliteConnection:
+                sqliteConnection.execute(
+                    """UPDATE validation_jobs
+                          SET status = ?, status_code = ?, result = ?,
+                              finished_at = CASE WHEN ? IN ('done', 'failed') THEN ? END
+                        WHERE id == ?""",
+                    (
+                        status,
+                        status_code,
+                        None if result is None else json.dumps(result),
+                        status,
+                        time.time(),
+                        job_id,
+                    ),
+                )
+
+    except sqlite3.Error as error:
+        logger.error("Error while working with SQLite: %s", error)
 
-        sqlite_select_query = """SELECT validated, user_entered, data from section_data where name == ? AND section == ?"""
 
-        data_tuple = (name, section)
-        cursor.execute(sqlite_select_query, data_tuple)
-        records = cursor.fetchall()
+def retrieve_validation_job(job_id):
+    """Return a validation job as a dict, or None if there is no such job."""
+    try:
+        with database_connection() as sqliteConnection, timed("db-read"):
+            record = sqliteConnection.execute(
+                """SELECT id, service, status, status_code, result, deadline, created_at, finished_at
+                   from validation_jobs where id == ?""",
+                (job_id,),
+            ).fetchone()
 
-        if len(records) > 0:
-            # since name-section is the primary key, there should be just one result here
-            # [(1, 1, b'\x80\x04\x95\xad\x00\x00\x00\x00\x00\x00\x00}\x94(\x8c\x04plex\x94}\x94(\x8c\x03url\x94\x8c\x19http://192.168.1.11:32400\x94\x8c\x05token\x94\x8c\x142PxWuxX_NydKLKKEt3Z2\x94\x8c\x08db_cache\x94K(\x8c\x07timeout\x94K<\x8c\nverify_ssl\x94\x89\x8c\rclean_bundles\x94\x89\x8c\x0bempty_trash\x94\x89\x8c\x08optimize\x94\x89u\x8c\x05valid\x94\x88u.')]
-            validated = booler(records[0][0])
-            user_entered = booler(records[0][1])
-            data = pickle.loads(records[0][2])
-        else:
-            validated = False
-            user_entered = False
-            data = None
+    except sqlite3.Error as error:
+        logger.error("Error while working with SQLite: %s", error)
+        return None
+
+    if record is None:
+        return None
+
+    job_id, service, status, status_code, result, deadline, created_at, finished_at = (
+        record
+    )
+    return {
+        "job_id": job_id,
+        "service": service,
+        "status": status,
+        "status_code": status_code,
+        "result": None if result is None else json.loads(result),
+        "deadline": deadline,
+        "created_at": created_at,
+        "finished_at": finished_at,
+    }
+
+
+def save_cached_validation(key, service, valid, status_code, result, ttl):
+    now = time.time()
 
-        cursor.close()
+    try:
+        with database_connection() as sqliteConnection, timed("db-write"):
+            with sqliteConnection:
+                sqliteConnection.execute(
+                    """DELETE from validation_cache where expires_at < ?""", (now,)
+                )
+                sqliteConnection.execute(
+                    """INSERT INTO validation_cache (key, service, valid, status_code, result, expires_at)
+                              VALUES (?, ?, ?, ?, ?, ?)
+                          ON CONFLICT (key) DO UPDATE SET
+                              valid = excluded.valid,
+                              status_code = excluded.status_code,
+                              result = excluded.result,
+                              expires_at = excluded.expires_at,
+                              hits = 0""",
+                    (key, service, valid, status_code, json.dumps(result), now + ttl),
+                )
 
     except sqlite3.Error as error:
-        print("Error while working with SQLite", error)
-    finally:
-        if sqliteConnection:
-            sqliteConnection.close()
+        logger.error("Error while working with SQLite: %s", error)
 
-    return validated, user_entered, data
 
+def retrieve_cached_validation(key):
+    """Return an unexpired cached validation as (status_code, result), or None."""
+    try:
+        with database_connection() as sqliteConnection, timed("db-read"):
+            record = sqliteConnection.execute(
+                """SELECT status_code, result from validation_cache
+                   where key == ? AND expires_at >= ?""",
+                (key, time.time()),
+            ).fetchone()
+
+            if record is not None:
+                with sqliteConnection:
+                    sqliteConnection.execute(
+                        """UPDATE validation_cache SET hits = hits + 1 where key == ?""",
+                        (key,),
+                    )
+
+    except sqlite3.Error as error:
+        logger.error("Error while working with SQLite: %s", error)
+        return None
+
+    if record is None:
+        return None
+
+    status_code, result = record
+    return status_code, json.loads(result)
+
+
+def validation_cache_entries():
+    """Per service: live positive and negative entries and the hits they have served."""
+    entries = {}
 
-def reset_data(name, section=None):
     try:
-        sqliteConnection = sqlite3.connect(
-            DATABASE_PATH,
-            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+        with database_connection() as sqliteConnection, timed("db-read"):
+            records = sqliteConnection.execute(
+                """SELECT service, valid, count(*), sum(hits) from validation_cache
+                   where expires_at >= ? GROUP BY service, valid""",
+                (time.time(),),
+            ).fetchall()
+
+    except sqlite3.Error as error:
+        logger.error("Error while working with SQLite: %s", error)
+        return entries
+
+    for service, valid, count, hits in records:
+        service_entries = entries.setdefault(
+            service, {"valid": 0, "invalid": 0, "hits": 0}
         )
-        cursor = sqliteConnection.cursor()
+        service_entries["valid" if booler(valid) else "invalid"] += count
+        service_entries["hits"] += hits or 0
+
+    return entries
+
 
-        if section:
-            sqlite_delete_query = (
-                """DELETE from section_data where name == ? AND section == ?"""
-            )
+def reset_data(name, section=None):
+    flush_pending_sections()
 
-            data_tuple = (name, section)
-        else:
-            sqlite_delete_query = """DELETE from section_data where name == ?"""
+    try:
+        with database_connection() as sqliteConnection, timed("db-write"):
+            with sqliteConnection:
+                if section:
+                    sqlite_delete_query = (
+                        """DELETE from section_data where name == ? AND section == ?"""
+                    )
 
-            data_tuple = name
+                    data_tuple = (name, section)
+                else:
+                    sqlite_delete_query = """DELETE from section_data where name == ?"""
 
-        cursor.execute(sqlite_delete_query, data_tuple)
+                    data_tuple = (name,)
 
-        sqliteConnection.commit()
+                    sqliteConnection.execute(
+                        """DELETE from config_artifacts where name == ?""", data_tuple
+                    )
 
-        cursor.close()
+                sqliteConnection.execute(sqlite_delete_query, data_tuple)
 
     except sqlite3.Error as error:
-        print("Error while working with SQLite", error)
-    finally:
-        if sqliteConnection:
-            sqliteConnection.close()
+        logger.error("Error while working with SQLite: %s", error)
+
+
+def migrate_section_data():
+    """
+    Rewrite rows still stored as pickles in the current format.
+
+    Returns a (converted, skipped) tuple; unreadable rows are left untouched.
+    """
+    converted = 0
+    skipped = 0
+
+    with database_connection() as sqliteConnection:
+        records = sqliteConnection.execute(
+            """SELECT name, section, data from section_data"""
+        ).fetchall()
+
+        with sqliteConnection:
+            for name, section, blob in records:
+                if not is_legacy_section_data(blob):
+                    continue
+
+                try:
+                    data = decode_section_data(blob)
+                except SectionDataError as error:
+                    logger.warning("Skipping %s/%s: %s", name, section, error)
+                    skipped += 1
+                    continue
+
+                sqliteConnection.execute(
+                    """UPDATE section_data SET data = ? WHERE name == ? AND section == ?""",
+                    (encode_section_data(data), name, section),
+                )
+                converted += 1
+
+    return converted, skipped
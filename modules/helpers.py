@@ -1,64 +1,12 @@
+import hashlib
 import os
 import re
 from flask import current_app as app
 from pathlib import Path
+from types import MappingProxyType
 
-
-def build_oauth_dict(source, form_data):
-    data = {source: {"authorization": {}}}
-    for key in form_data:
-        final_key = key.replace(source + "_", "", 1)
-        value = form_data[key]
-
-        if (
-            (final_key == "client_id")
-            or (final_key == "client_secret")
-            or (final_key == "pin")
-        ):
-            data[source][final_key] = value
-        elif final_key == "validated":
-            data[final_key] = value
-        else:
-            if final_key != "url":
-                data[source]["authorization"][final_key] = value
-
-    return data
-
-
-def build_simple_dict(source, form_data):
-    data = {source: {}}
-    for key in form_data:
-        final_key = key.replace(source + "_", "", 1)
-        value = form_data[key]
-
-        if value is not None and not isinstance(value, bool):
-            try:
-                value = int(value)
-            except ValueError:
-                value = value
-
-        if final_key == "validated":
-            data[final_key] = value
-        else:
-            data[source][final_key] = value
-
-    # Special handling for run_order to split and clean it into a list
-    if "run_order" in data[source]:
-        run_order = data[source]["run_order"]
-        if run_order is not None:
-            run_order = [item.strip() for item in run_order.split() if item.strip()]
-        else:
-            run_order = ["operations", "metadata", "collections", "overlays"]
-        data[source]["run_order"] = run_order
-
-    return data
-
-
-def build_config_dict(source, form_data):
-    if (source == "trakt") or (source == "mal"):
-        return build_oauth_dict(source, form_data)
-    else:
-        return build_simple_dict(source, form_data)
+# the StepRegistry for the templates directory, built at startup
+_step_registry = None
 
 
 def belongs_in_template_list(file):
@@ -97,9 +45,28 @@ def user_visible_name(raw_name):
     return formatted_name
 
 
+def freeze(thing):
+    """Recursively convert dicts and lists into read-only mappings and tuples."""
+    if isinstance(thing, dict):
+        return MappingProxyType({key: freeze(value) for key, value in thing.items()})
+    if isinstance(thing, (list, tuple)):
+        return tuple(freeze(value) for value in thing)
+    return thing
+
+
+def thaw(thing):
+    """Return a mutable deep copy of something produced by `freeze`."""
+    if isinstance(thing, MappingProxyType):
+        return {key: thaw(value) for key, value in thing.items()}
+    if isinstance(thing, tuple):
+        return [thaw(value) for value in thing]
+    return thing
+
+
 def booler(thing):
-    if type(thing) == str:
-        thing = eval(thing)
+    # SQLite hands back 0/1; older rows may hold "True"/"False" strings
+    if isinstance(thing, str):
+        return thing.strip().lower() in ("true", "1", "on")
     return bool(thing)
 
 
@@ -112,58 +79,81 @@ def get_bits(file):
     return file_stem, num, raw_name
 
 
-def get_next(file_list, current_file):
-    current_index = file_list.index(current_file)
-    if current_index + 1 < len(file_list):
-        return file_list[current_index + 1].rsplit(".", 1)[0]
-    return None
+class Step:
+    """One wizard page, with its neighbours and position worked out up front."""
 
+    __slots__ = ("num", "file", "stem", "name", "raw_name", "prev", "next", "index")
 
-def template_record(file, prev, next):
-    rec = {}
-    file_stem, num, raw_name = get_bits(file)
-    rec["num"] = num
-    rec["file"] = file
-    rec["stem"] = file_stem
-    rec["name"] = user_visible_name(raw_name)
-    rec["raw_name"] = raw_name
-    rec["next"] = next
-    rec["prev"] = prev
+    def __init__(self, num, file, prev, next, index):
+        file_stem, _, raw_name = get_bits(file)
+        self.num = num
+        self.file = file
+        self.stem = file_stem
+        self.name = user_visible_name(raw_name)
+        self.raw_name = raw_name
+        self.prev = prev
+        self.next = next
+        self.index = index
 
-    return rec
+    def __repr__(self):
+        return f"Step({self.stem!r}, index={self.index})"
 
 
-def get_menu_list():
-    templates_dir = os.path.join(app.root_path, "templates")
-    file_list = sorted(
-        item
-        for item in os.listdir(templates_dir)
-        if os.path.isfile(os.path.join(templates_dir, item))
-    )
-    final_list = []
+class StepRegistry:
+    """
+    Every wizard step in order, with O(1) lookup by stem and by number.
 
-    for file in file_list:
-        if belongs_in_template_list(file):
-            file_stem, num, raw_name = get_bits(file)
-            final_list.append((file, user_visible_name(raw_name)))
+    Built once from the templates directory; nothing on it changes afterwards.
+    """
 
-    return final_list
+    __slots__ = ("steps", "by_num", "by_stem", "menu", "templates_version")
 
+    def __init__(self, steps, templates_version):
+        self.steps = tuple(steps)
+        self.by_num = MappingProxyType({step.num: step for step in self.steps})
+        self.by_stem = MappingProxyType({step.stem: step for step in self.steps})
+        self.menu = tuple((step.file, step.name) for step in self.steps)
+        # see templates_version(); changes with any template edit
+        self.templates_version = templates_version
 
-def get_template_list():
-    templates_dir = os.path.join(app.root_path, "templates")
+    def __len__(self):
+        return len(self.steps)
+
+    def progress(self, step):
+        return round((step.index + 1) / len(self.steps) * 100)
+
+
+def templates_version(templates_dir):
+    """
+    A digest of the path and mtime of every template, modals included.
+
+    Editing a file in place doesn't touch its directory's mtime, so each
+    file is looked at; adding, removing or renaming one changes it too.
+    """
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(templates_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            entries.append(
+                (os.path.relpath(path, templates_dir), os.stat(path).st_mtime_ns)
+            )
+    return hashlib.sha256(repr(entries).encode("utf-8")).hexdigest()[:16]
+
+
+def build_step_registry(templates_dir):
+    version = templates_version(templates_dir)
     file_list = sorted(
         item
         for item in os.listdir(templates_dir)
         if os.path.isfile(os.path.join(templates_dir, item))
     )
 
-    templates = {}
+    numbered = []
     type_counter = {
         "012": 0,
         "013": 0,
     }  # Counters for movie, show types
-    prev_item = "001-start"
 
     for file in file_list:
         if belongs_in_template_list(file):
@@ -181,11 +171,39 @@ def get_template_list():
             else:
                 num = file_prefix
 
-            next = get_next(file_list, file)
-            prev = prev_item
-            rec = template_record(file, prev, next)
-            rec["num"] = num  # Update the num to include the counter
-            templates[num] = rec
-            prev_item = rec["stem"]
+            numbered.append((num, file))
 
-    return templates
+    stems = [Path(file).stem for num, file in numbered]
+    steps = []
+    for index, (num, file) in enumerate(numbered):
+        # the first step is its own "previous" page
+        prev = stems[index - 1] if index > 0 else "001-start"
+        next = stems[index + 1] if index + 1 < len(stems) else None
+        steps.append(Step(num, file, prev, next, index))
+
+    return StepRegistry(steps, version)
+
+
+def get_step_registry():
+    global _step_registry
+    templates_dir = os.path.join(app.root_path, "templates")
+
+    registry = _step_registry
+    if registry is None or (
+        # only worth a stat per template per request while someone is
+        # editing them
+        app.debug
+        and registry.templates_version != templates_version(templates_dir)
+    ):
+        registry = build_step_registry(templates_dir)
+        _step_registry = registry
+
+    return registry
+
+
+def get_menu_list():
+    return get_step_registry().menu
+
+
+def get_template_list():
+    return get_step_registry().by_num
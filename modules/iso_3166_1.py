@@ -1,6 +1,6 @@
 # iso_3166_1_region.py
 
-iso_3166_1_regions = [
+iso_3166_1_regions = (
     ("AD", "Andorra"),
     ("AE", "United Arab Emirates"),
     ("AF", "Afghanistan"),
@@ -250,4 +250,4 @@ iso_3166_1_regions = [
     ("ZA", "South Africa"),
     ("ZM", "Zambia"),
     ("ZW", "Zimbabwe"),
-]
+)
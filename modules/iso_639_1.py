@@ -1,4 +1,4 @@
-iso_639_1_languages = [
+iso_639_1_languages = (
     ("ab", "Abkhazian"),
     ("aa", "Afar"),
     ("af", "Afrikaans"),
@@ -183,4 +183,4 @@ iso_639_1_languages = [
     ("yo", "Yoruba"),
     ("za", "Zhuang, Chuang"),
     ("zu", "Zulu"),
-]
+)
@@ -1,6 +1,6 @@
 # iso_639_2_languages.py
 
-iso_639_2_languages = [
+iso_639_2_languages = (
     ("aar", "Afar (aar)"),
     ("abk", "Abkhazian (abk)"),
     ("ave", "Avestan (ave)"),
@@ -199,4 +199,4 @@ iso_639_2_languages = [
     ("yor", "Yoruba (yor)"),
     ("zha", "Zhuang; Chuang (zha)"),
     ("zul", "Zulu (zul)"),
-]
+)
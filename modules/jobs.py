@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from .database import (
+    retrieve_validation_job,
+    save_validation_job,
+    update_validation_job,
+)
+from . import upstream
+from .logs import get_logger
+
+logger = get_logger(__name__)
+
+# Validations talk to hosts that may be slow or unreachable. They run on a
+# small per-worker thread pool instead of in the request, so a web worker is
+# only ever held for as long as it takes to queue a job or read its status.
+
+MAX_WORKERS = int(os.getenv("QUICKSTART_VALIDATION_WORKERS", "4"))
+# jobs queued or running per worker before new ones are turned away
+MAX_PENDING = MAX_WORKERS * 4
+
+# seconds a job may take, counted from when it was queued. It is also the
+# budget for the upstream calls the job makes (see modules.upstream.budget):
+# their timeouts are cut to the time left and they stop being retried when
+# an attempt no longer fits, so the job ends with its own result by then.
+DEFAULT_DEADLINE = 30
+SERVICE_DEADLINES = {
+    # server settings and library calls
+    "plex": 60,
+    # plex.tv can be slow from some networks
+    "plex_users": 45,
+    "anidb": 45,
+    "mal": 45,
+    # every configured service at once; bounded by the slowest of them
+    "all": 90,
+}
+
+# time past its deadline a job gets to save its result (the validator's
+# own work, database writes) before its status reports it as lost
+DEADLINE_GRACE = 15
+
+# finished jobs are kept this long for late polls, then dropped
+JOB_RETENTION = 10 * 60
+
+_executor = None
+_slots = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def get_executor():
+    """Return this worker's executor and its slot semaphore, creating them after a fork."""
+    global _executor, _slots, _executor_pid
+    with _executor_lock:
+        if _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_WORKERS, thread_name_prefix="validation"
+            )
+            _slots = threading.BoundedSemaphore(MAX_PENDING)
+            _executor_pid = os.getpid()
+    return _executor, _slots
+
+
+def job_result(rv, invalid_status=None):
+    """Turn what a validator returned into a (status code, JSON body) pair."""
+    status_code = 200
+    if isinstance(rv, tuple):
+        rv, status_code = rv
+    body = rv.get_json()
+
+    if invalid_status is not None and not body.get("valid"):
+        status_code = invalid_status
+
+    return status_code, body
+
+
+def run_job(app, job_id, service, validator, data, invalid_status, slots, ends):
+    try:
+        with app.app_context():
+            update_validation_job(job_id, "running")
+            try:
+                # time spent queued counts against the budget
+                with upstream.budget(ends - time.monotonic()):
+                    rv = validator(data)
+                status_code, body = job_result(rv, invalid_status)
+                update_validation_job(job_id, "done", status_code, body)
+            except Exception as e:
+                logger.exception("%s validation failed", service)
+                update_validation_job(
+                    job_id, "failed", 500, {"valid": False, "error": str(e)}
+                )
+    finally:
+        slots.release()
+
+
+def submit_validation(service, validator, data, invalid_status=None):
+    """
+    Queue `validator(data)` and return the job id to poll.
+
+    `invalid_status` is the HTTP status to report when the result is not
+    valid. Raises JobQueueFull when this worker already has MAX_PENDING jobs.
+    """
+    executor, slots = get_executor()
+    if not slots.acquire(blocking=False):
+        raise JobQueueFull(f"{MAX_PENDING} validations already in progress")
+
+    job_id = uuid.uuid4().hex
+    deadline = SERVICE_DEADLINES.get(service, DEFAULT_DEADLINE)
+    try:
+        save_validation_job(job_id, service, deadline, JOB_RETENTION)
+        executor.submit(
+            run_job,
+            current_app._get_current_object(),
+            job_id,
+            service,
+            validator,
+            data,
+            invalid_status,
+            slots,
+            time.monotonic() + deadline,
+        )
+    except Exception:
+        slots.release()
+        raise
+
+    return job_id
+
+
+def validation_job_status(job_id):
+    """
+    Return a job's status, or None if it is unknown or has expired.
+
+    A job's upstream calls are bounded by its deadline, so it normally
+    reports its own result by then - a timeout among them, if that is what
+    happened. One still unfinished DEADLINE_GRACE past it is reported as
+    failed, as its worker most likely went away; should it finish after
+    all, the real result replaces that.
+    """
+    job = retrieve_validation_job(job_id)
+    if job is None:
+        return None
+
+    if (
+        job["status"] in ("pending", "running")
+        and time.time() > job["deadline"] + DEADLINE_GRACE
+    ):
+        seconds = round(job["deadline"] - job["created_at"])
+        job["status"] = "failed"
+        job["status_code"] = 504
+        job["result"] = {
+            "valid": False,
+            "error": f"{job['service']} validation timed out after {seconds}s",
+        }
+
+    return job
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+
+LOG_LEVEL = os.getenv("QUICKSTART_LOG_LEVEL", "INFO").upper()
+
+REDACTED = "<redacted>"
+
+# section fields holding credentials: plex/gotify/radarr token, tmdb/omdb/...
+# apikey, anidb password, trakt/mal client_secret and authorization, pins
+SECRET_KEY_PATTERN = re.compile(
+    r"token|key|password|secret|verifier|authorization|pin$", re.IGNORECASE
+)
+# the same fields written out inline, e.g. "token=abc" or "'apikey': 'abc'"
+SECRET_PAIR_PATTERN = re.compile(
+    r"""(['"]?\w*(?:token|key|password|secret|verifier)['"]?\s*[:=]\s*)(['"]?)[^\s,'"}]+\2""",
+    re.IGNORECASE,
+)
+
+
+def is_secret(key):
+    return isinstance(key, str) and SECRET_KEY_PATTERN.search(key) is not None
+
+
+def redact(value):
+    """Return a copy of `value` with the values of secret-looking keys masked."""
+    if isinstance(value, dict):
+        return {
+            key: (
+                REDACTED if is_secret(key) and item not in (None, "") else redact(item)
+            )
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(redact(item) for item in value)
+    if isinstance(value, str):
+        return SECRET_PAIR_PATTERN.sub(rf"\1\2{REDACTED}\2", value)
+    return value
+
+
+class RedactionFilter(logging.Filter):
+    """Mask secrets in the formatted message and in any structured fields."""
+
+    def filter(self, record):
+        # masking the format string and its arguments separately breaks the
+        # formatting ("token: %s" loses its %s) and misses secrets passed as
+        # bare arguments, so mask the finished text instead
+        try:
+            message = record.getMessage()
+        except Exception:
+            # leave a bad format to the handler, which reports it
+            message = None
+        if message is not None:
+            record.msg = redact(message)
+            record.args = None
+        if hasattr(record, "fields"):
+            record.fields = redact(record.fields)
+        return True
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    One line per record: time, level, logger and message, followed by the
+    record's `fields` and `timings` as key=value pairs.
+    """
+
+    def format(self, record):
+        line = (
+            f"{self.formatTime(record)} {record.levelname} {record.name} "
+            f"{record.getMessage()}"
+        )
+
+        pairs = dict(getattr(record, "fields", None) or {})
+        for phase, duration in (getattr(record, "timings", None) or {}).items():
+            pairs[f"{phase}_ms"] = round(duration, 1)
+        for key, value in pairs.items():
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                value = json.dumps(value, default=str)
+            line += f" {key}={value}"
+
+        if record.exc_info:
+            # exception messages quote URLs and parameters as given
+            line += "\n" + redact(self.formatException(record.exc_info))
+        return line
+
+
+def configure_logging(level=LOG_LEVEL):
+    """Send everything logged under `quickstart` to stdout; safe to call twice."""
+    logger = logging.getLogger("quickstart")
+    logger.setLevel(level)
+
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(StructuredFormatter())
+        # on the handler so it also sees records from child loggers
+        handler.addFilter(RedactionFilter())
+        logger.addHandler(handler)
+        # gunicorn configures the root logger too; don't log twice
+        logger.propagate = False
+
+    return logger
+
+
+def get_logger(name):
+    return logging.getLogger(f"quickstart.{name}")
+
+
+@contextmanager
+def timed(phase):
+    """
+    Add the time spent in the block to `phase` for the current request.
+
+    Repeated phases (several db reads, say) are summed. Outside a request
+    the block simply runs untimed.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_app_context():
+            timings = g.setdefault("timings", {})
+            timings[phase] = (
+                timings.get(phase, 0.0) + (time.perf_counter() - start) * 1000
+            )
+
+
+def request_timings():
+    """Per-phase durations of the current request, in milliseconds."""
+    return dict(g.get("timings", {})) if has_app_context() else {}
+
+
+def server_timing_header(timings):
+    return ", ".join(
+        f"{phase};dur={duration:.1f}" for phase, duration in timings.items()
+    )
@@ -0,0 +1,169 @@
+import sqlite3
+
+from .database import open_connection
+from .logs import get_logger
+
+logger = get_logger(__name__)
+
+# Each migration runs once, in order, inside the same transaction that bumps
+# PRAGMA user_version to its position in this list. Only ever append here.
+
+
+def create_section_data(sqliteConnection):
+    # databases created before migrations existed already have this table
+    sqliteConnection.execute(
+        """CREATE TABLE IF NOT EXISTS section_data (
+                                        name TEXT NOT NULL,
+                                        section TEXT NOT NULL,
+                                        validated BOOLEAN NOT NULL,
+                                        user_entered BOOLEAN NOT NULL,
+                                        data TEXT,
+                                        PRIMARY KEY (name, section)
+                                        );"""
+    )
+
+
+def add_section_timestamps(sqliteConnection):
+    # ALTER TABLE can't add a column with a non-constant default, so existing
+    # rows are stamped with the time of the migration instead
+    sqliteConnection.execute("ALTER TABLE section_data ADD COLUMN created_at TEXT")
+    sqliteConnection.execute("ALTER TABLE section_data ADD COLUMN updated_at TEXT")
+    sqliteConnection.execute(
+        """UPDATE section_data SET created_at = CURRENT_TIMESTAMP,
+                                   updated_at = CURRENT_TIMESTAMP"""
+    )
+
+
+def add_config_index(sqliteConnection):
+    # the primary key already covers lookups by name; this lets a config's
+    # sections be listed by when they last changed without a sort
+    sqliteConnection.execute(
+        """CREATE INDEX IF NOT EXISTS section_data_name_updated_at
+           ON section_data (name, updated_at)"""
+    )
+
+
+def add_config_artifacts(sqliteConnection):
+    # rendered configs, addressed by a hash of their content; `inputs` is a
+    # hash of what they were rendered from (see modules.output.config_inputs),
+    # so a render can be reused until any of that changes. Every header style
+    # is rendered from the same inputs; the index below is replaced by
+    # index_config_artifacts_by_inputs
+    sqliteConnection.execute(
+        """CREATE TABLE IF NOT EXISTS config_artifacts (
+                                        name TEXT NOT NULL,
+                                        digest TEXT NOT NULL,
+                                        header_style TEXT NOT NULL,
+                                        inputs TEXT NOT NULL,
+                                        content TEXT NOT NULL,
+                                        validated BOOLEAN NOT NULL,
+                                        validation_error TEXT,
+                                        created_at TEXT,
+                                        PRIMARY KEY (name, digest)
+                                        );"""
+    )
+    sqliteConnection.execute(
+        """CREATE INDEX IF NOT EXISTS config_artifacts_name_inputs
+           ON config_artifacts (name, header_style, inputs)"""
+    )
+
+
+def add_validation_jobs(sqliteConnection):
+    # validations run in a background thread of whichever worker accepted
+    # them; their state lives here so any worker can answer a status poll
+    sqliteConnection.execute(
+        """CREATE TABLE IF NOT EXISTS validation_jobs (
+                                        id TEXT PRIMARY KEY,
+                                        service TEXT NOT NULL,
+                                        status TEXT NOT NULL,
+                                        status_code INTEGER,
+                                        result TEXT,
+                                        deadline REAL NOT NULL,
+                                        created_at REAL NOT NULL,
+                                        finished_at REAL
+                                        );"""
+    )
+    sqliteConnection.execute(
+        """CREATE INDEX IF NOT EXISTS validation_jobs_created_at
+           ON validation_jobs (created_at)"""
+    )
+
+
+def add_validation_cache(sqliteConnection):
+    # validation results keyed by service, URL and a hash of the credentials,
+    # shared by every worker; see modules.validations.cached_validation
+    sqliteConnection.execute(
+        """CREATE TABLE IF NOT EXISTS validation_cache (
+                                        key TEXT PRIMARY KEY,
+                                        service TEXT NOT NULL,
+                                        valid BOOLEAN NOT NULL,
+                                        status_code INTEGER NOT NULL,
+                                        result TEXT NOT NULL,
+                                        expires_at REAL NOT NULL,
+                                        hits INTEGER NOT NULL DEFAULT 0
+                                        );"""
+    )
+
+
+def index_config_artifacts_by_inputs(sqliteConnection):
+    # renders are looked up by name and inputs, for every header style at
+    # once, which used only the name prefix of the previous index
+    sqliteConnection.execute("DROP INDEX IF EXISTS config_artifacts_name_inputs")
+    sqliteConnection.execute(
+        """CREATE INDEX IF NOT EXISTS config_artifacts_name_inputs
+           ON config_artifacts (name, inputs)"""
+    )
+
+
+MIGRATIONS = [
+    create_section_data,
+    add_section_timestamps,
+    add_config_index,
+    add_config_artifacts,
+    add_validation_jobs,
+    add_validation_cache,
+    index_config_artifacts_by_inputs,
+]
+
+
+def schema_version(sqliteConnection):
+    return sqliteConnection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate_database():
+    """
+    Bring config/quickstart.sqlite up to the latest schema version.
+
+    Run once at startup. Safe to call from several workers at once: the
+    version is re-read after taking the write lock, so each migration is
+    applied by exactly one of them. Returns the resulting version.
+    """
+    sqliteConnection = open_connection()
+    # manage transactions by hand so DDL and the version bump commit together
+    sqliteConnection.isolation_level = None
+
+    try:
+        # persistent, so this only does anything the first time
+        sqliteConnection.execute("PRAGMA journal_mode=WAL")
+
+        if schema_version(sqliteConnection) >= len(MIGRATIONS):
+            return schema_version(sqliteConnection)
+
+        sqliteConnection.execute("BEGIN IMMEDIATE")
+        try:
+            version = schema_version(sqliteConnection)
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                logger.info(
+                    "Applying database migration %s: %s", number, migration.__name__
+                )
+                migration(sqliteConnection)
+                # PRAGMA doesn't take parameters; number is always an int
+                sqliteConnection.execute(f"PRAGMA user_version = {number}")
+            sqliteConnection.execute("COMMIT")
+        except sqlite3.Error:
+            sqliteConnection.execute("ROLLBACK")
+            raise
+
+        return schema_version(sqliteConnection)
+    finally:
+        sqliteConnection.close()
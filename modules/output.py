@@ -1,16 +1,27 @@
+import hashlib
 import io
-import jsonschema
-import pyfiglet
+import json
+import threading
+from collections import OrderedDict
 from ruamel.yaml import YAML
 
+from flask import session
+
+from .database import retrieve_config_artifacts, save_config_artifacts
 from .persistence import (
+    cached_sections,
     save_settings,
     retrieve_settings,
+    retrieve_all_settings,
     check_minimum_settings,
     flush_session_storage,
     notification_systems_available,
 )
-from .helpers import build_config_dict, get_template_list, get_bits
+from .helpers import get_step_registry, get_bits
+from .schema import get_schema_version, validate_config
+from .logs import get_logger, timed
+
+logger = get_logger(__name__)
 
 
 def add_border_to_ascii_art(art):
@@ -24,8 +35,80 @@ def add_border_to_ascii_art(art):
     return "\n".join(bordered_art)
 
 
-def section_heading(title):
-    return add_border_to_ascii_art(pyfiglet.figlet_format(title))
+# Bump whenever a change to this module alters the YAML it produces for the
+# same stored data, so renders stored by the previous version aren't served.
+RENDERER_VERSION = 1
+
+HEADER_FONT = "standard"
+# every style the final page offers; one build renders them all
+HEADER_STYLES = ("ascii", "divider", "none")
+
+# one loaded Figlet per font; loading parses the font file
+_figlets = {}
+# rendered headers keyed by (title, style, font)
+_headings = {}
+
+
+def get_figlet(font=HEADER_FONT):
+    figlet = _figlets.get(font)
+    if figlet is None:
+        import pyfiglet
+
+        figlet = pyfiglet.Figlet(font=font)
+        _figlets[font] = figlet
+    return figlet
+
+
+def section_heading(title, style="ascii", font=HEADER_FONT):
+    key = (title, style, font)
+    heading = _headings.get(key)
+    if heading is None:
+        if style == "ascii":
+            heading = add_border_to_ascii_art(get_figlet(font).renderText(title))
+        elif style == "divider":
+            heading = "#==================== " + title + " ====================#"
+        else:
+            heading = ""
+        _headings[key] = heading
+    return heading
+
+
+def warm_section_headings(styles=("ascii", "divider")):
+    """Render the header of every step (and the KOMETA banner) ahead of time."""
+    titles = ["KOMETA"] + [step.name for step in get_step_registry().steps]
+    for style in styles:
+        for title in titles:
+            section_heading(title, style)
+
+
+# rendered YAML bodies keyed by (section, content digest), shared by every
+# header style and by every config built in this worker; least recently used
+# first, so configs that come and go don't push out the ones in use
+FRAGMENT_CACHE_SIZE = 256
+_fragments = OrderedDict()
+_fragments_lock = threading.Lock()
+
+
+def section_digest(data):
+    # key order is part of the output, so it is part of the digest too
+    raw = json.dumps(data, default=str).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+def cached_fragment(key):
+    with _fragments_lock:
+        body = _fragments.get(key)
+        if body is not None:
+            _fragments.move_to_end(key)
+        return body
+
+
+def store_fragment(key, body):
+    with _fragments_lock:
+        _fragments[key] = body
+        _fragments.move_to_end(key)
+        while len(_fragments) > FRAGMENT_CACHE_SIZE:
+            _fragments.popitem(last=False)
 
 
 def clean_section_data(section_data, config_attribute):
@@ -45,27 +128,23 @@ def clean_section_data(section_data, config_attribute):
     return clean_data
 
 
-def build_config(header_style="ascii"):
-    sections = get_template_list()
+def build_config(header_styles=HEADER_STYLES):
+    sections = get_step_registry().steps
 
     config_data = {}
-    header_art = {}
-
-    for name in sections:
-        item = sections[name]
-        # {'num': '001', 'file': '001-start.html', 'stem': '001-start', 'name': 'Start', 'raw_name': 'start', 'next': '010-plex', 'prev': '001-start'}
-        persistence_key = item["stem"]
-        config_attribute = item["raw_name"]
-        if header_style == "ascii":
-            header_art[config_attribute] = section_heading(item["name"])
-        elif header_style == "divider":
-            header_art[config_attribute] = (
-                "#==================== " + item["name"] + " ====================#"
-            )
-        else:
-            header_art[config_attribute] = ""
+    section_titles = {}
+
+    # one query for the whole config rather than one per section
+    stored_settings = retrieve_all_settings()
+
+    for item in sections:
+        # Step('001-start', index=0): num '001', file '001-start.html', name 'Start', raw_name 'start', next '010-plex', prev '001-start'
+        persistence_key = item.stem
+        config_attribute = item.raw_name
+        # headers are only rendered for sections that make it into the config
+        section_titles[config_attribute] = item.name
 
-        section_data = retrieve_settings(persistence_key)
+        section_data = stored_settings.get(config_attribute, {})
 
         # {'mal': {'authorization': {'code_verifier': 'OEOOZwnH8RWLczgahkUbo__vabgHl7XyvWkDx0twLB4FCaxPY88C9tNXnmxzBq946vSekKbPc3WhW4SwWrq0ld5xKpm27foQx4RXfnXY25iL7Pm0WCCuYkO-iQga69jv', 'localhost_url': '', 'access_token': 'None', 'token_type': 'None', 'expires_in': 'None', 'refresh_token': 'None'}, 'client_id': 'Enter MyAnimeList Client ID', 'client_secret': 'Enter MyAnimeList Client Secret'}, 'valid': True}
 
@@ -81,39 +160,42 @@ def build_config(header_style="ascii"):
         "and YAML by Red Hat extension. VSC will also leverage the above link to enhance Kometa yml edits."
     )
 
-    # Configure the YAML instance
-    yaml = YAML(typ="safe", pure=True)
+    # Prepare the final YAML content, once per header style
+    yaml_contents = {
+        header_style: (
+            "# yaml-language-server: $schema=https://raw.githubusercontent.com/Kometa-Team/Kometa/nightly/json-schema/config-schema.json\n\n"
+            f"{section_heading('KOMETA', header_style)}\n\n"
+            f"{header_comment}\n\n"
+        )
+        for header_style in header_styles
+    }
 
-    with open("json-schema/config-schema.json", "r") as file:
-        schema = yaml.load(file)
+    yaml = None
 
-    yaml.default_flow_style = False
-    yaml.sort_keys = False
-
-    # Prepare the final YAML content
-    yaml_content = (
-        "# yaml-language-server: $schema=https://raw.githubusercontent.com/Kometa-Team/Kometa/nightly/json-schema/config-schema.json\n\n"
-        f"{section_heading('KOMETA') if header_style == 'ascii' else ('#==================== KOMETA ====================#' if header_style == 'divider' else '')}\n\n"
-        f"{header_comment}\n\n"
-    )
-
-    def dump_section(title, name, data):
-        # Convert 'true' and 'false' strings to boolean values
-        #  this should be handled in the persistence
-        for key, value in data.items():
-            if value == "true":
-                data[key] = True
-            elif value == "false":
-                data[key] = False
+    def dump_section(name, data):
+        nonlocal yaml
+        # values were typed when the form was saved (see modules.coercion)
 
         # Remove 'valid' key if present
         data = {k: v for k, v in data.items() if k != "valid"}
 
-        yaml = YAML()
+        # this is exactly what ends up in the YAML, so validate it as-is
+        config_document.update(data)
+
+        key = (name, section_digest(data))
+        body = cached_fragment(key)
+        if body is not None:
+            return body
 
-        with io.StringIO() as stream:
+        if yaml is None:
+            yaml = YAML()
+
+        with io.StringIO() as stream, timed("yaml"):
             yaml.dump(data, stream)
-            return f"{title}\n{stream.getvalue().strip()}\n\n"
+            body = stream.getvalue().strip()
+
+        store_fragment(key, body)
+        return body
 
     ordered_sections = [
         ("playlist_files", "160-playlist_files"),
@@ -134,26 +216,90 @@ def build_config(header_style="ascii"):
         ("mal", "130-mal"),
     ]
 
+    config_document = {}
+    fragments = {header_style: [] for header_style in header_styles}
+
     for section_key, section_stem in ordered_sections:
         if section_key in config_data:
             section_data = config_data[section_key]
-            section_art = header_art[section_key]
-
-            yaml_content += dump_section(section_art, section_key, section_data)
-
-    print("\n==================================================\n")
-    print(f"config_data:\n{config_data}")
-    print("\n==================================================\n")
-    print(f"yaml_content:\n{yaml_content}")
-    print("\n==================================================\n")
-
-    validated = False
-    validation_error = None
-
-    try:
-        jsonschema.validate(yaml.load(yaml_content), schema)
-        validated = True
-    except jsonschema.exceptions.ValidationError as e:
-        validation_error = e
-
-    return validated, validation_error, config_data, yaml_content
+            # dumped once, whatever header it gets
+            body = dump_section(section_key, section_data)
+
+            for header_style in header_styles:
+                section_art = section_heading(section_titles[section_key], header_style)
+                fragments[header_style].append(f"{section_art}\n{body}\n\n")
+
+    for header_style in header_styles:
+        yaml_contents[header_style] += "".join(fragments[header_style])
+
+    with timed("validate"):
+        validation_errors = validate_config(config_document)
+    validated = not validation_errors
+    validation_error = "\n".join(validation_errors) if validation_errors else None
+
+    logger.debug(
+        "built config",
+        extra={
+            "fields": {
+                "sections": sorted(config_data),
+                "bytes": len(yaml_contents[header_styles[0]]),
+                "validated": validated,
+            }
+        },
+    )
+    logger.debug("config_data: %s", config_data)
+
+    return validated, validation_error, config_data, yaml_contents
+
+
+def config_inputs():
+    """
+    A digest of everything a render of the current config depends on.
+
+    Besides the stored sections and the schema, that is the code and
+    templates doing the rendering: step titles and order come from the
+    templates, so a deploy changing either yields new inputs.
+    """
+    registry = get_step_registry()
+    sections = cached_sections(name=session["config_name"])
+    raw = json.dumps(
+        [
+            RENDERER_VERSION,
+            registry.templates_version,
+            [(step.stem, step.name) for step in registry.steps],
+            get_schema_version(),
+            sorted(sections.items()),
+        ],
+        default=str,
+    ).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
+
+
+def get_config_artifacts():
+    """
+    Return the rendered config for the current session in every header style.
+
+    Maps header style to artifact. Renders are stored in SQLite keyed by a
+    hash of their content, so any worker can serve one; a new build only
+    happens when a section or the schema changed since the last one.
+    """
+    name = session["config_name"]
+    inputs = config_inputs()
+
+    artifacts = retrieve_config_artifacts(name, inputs)
+    if set(artifacts) != set(HEADER_STYLES):
+        validated, validation_error, config_data, yaml_contents = build_config()
+        artifacts = {
+            header_style: {
+                "digest": hashlib.sha256(yaml_content.encode("utf-8")).hexdigest(),
+                "header_style": header_style,
+                "inputs": inputs,
+                "content": yaml_content,
+                "validated": validated,
+                "validation_error": validation_error,
+            }
+            for header_style, yaml_content in yaml_contents.items()
+        }
+        save_config_artifacts(name, artifacts.values())
+
+    return artifacts
@@ -1,15 +1,43 @@
-from flask import session
+from flask import g, session
 import os
 import secrets
 from ruamel.yaml import YAML
 from flask import current_app as app
 
-from .helpers import build_config_dict, get_template_list, get_bits, booler
+from .coercion import coerce_form
+from .logs import get_logger, timed
+from .helpers import (
+    get_template_list,
+    get_bits,
+    booler,
+    freeze,
+    thaw,
+)
 from .iso_639_1 import iso_639_1_languages  # Importing the languages list
 from .iso_639_2 import iso_639_2_languages  # Importing the languages list
 from .iso_3166_1 import iso_3166_1_regions  # Importing the regions list
 
-from .database import save_section_data, retrieve_section_data, reset_data
+from .database import (
+    save_section_data,
+    retrieve_all_sections,
+    reset_data,
+)
+
+logger = get_logger(__name__)
+
+PROTOTYPE_CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "json-schema",
+    "prototype_config.yml",
+)
+
+# hits and misses of the request-scoped section cache, summed over every
+# request this process has served
+_section_cache_totals = {"hits": 0, "misses": 0}
+
+# (mtime, parsed json-schema/prototype_config.yml), frozen so it can be
+# shared by every request (and, when preloaded, every worker)
+_prototype_config = None
 
 
 def extract_names(raw_source):
@@ -27,24 +55,6 @@ def extract_names(raw_source):
     return source, source_name
 
 
-def clean_form_data(form_data):
-    clean_data = {}
-
-    for key in form_data:
-        value = form_data[key]
-        lc_value = value.lower() if isinstance(value, str) else None
-        if len(value) == 0 or lc_value == "none":
-            clean_data[key] = None
-        elif lc_value == "true" or lc_value == "on":
-            clean_data[key] = True
-        elif lc_value == "false":
-            clean_data[key] = False
-        else:
-            clean_data[key] = value
-
-    return clean_data
-
-
 def save_settings(raw_source, form_data):
     # get source from referrer
     source, source_name = extract_names(raw_source)
@@ -54,12 +64,12 @@ def save_settings(raw_source, form_data):
     # grab new config name if they entered one:
     if "config_name" in form_data:
         session["config_name"] = form_data["config_name"]
-        print(f"recieved config name in form: {session['config_name']}")
-
-    clean_data = clean_form_data(form_data)
+        logger.debug("received config name in form: %s", session["config_name"])
 
     if len(source) > 0:
-        data = build_config_dict(source_name, clean_data)
+        # typed according to the schema, so nothing downstream re-converts it
+        with timed("coerce"):
+            data = coerce_form(source_name, form_data)
 
         base_data = get_dummy_data(source_name)
 
@@ -67,7 +77,9 @@ def save_settings(raw_source, form_data):
 
         validated = data["validated"] if "validated" in data else False
 
-        print(f"saving under config_name: {session['config_name']}")
+        logger.debug("saving %s under config_name: %s", source, session["config_name"])
+
+        invalidate_section_cache(session["config_name"])
 
         save_section_data(
             name=session["config_name"],
@@ -77,20 +89,50 @@ def save_settings(raw_source, form_data):
             data=data,
         )
 
-        print(f"data saved for {source}")
 
+def cached_sections(name):
+    """
+    Return every stored section of a config, reading them at most once per request.
 
-def retrieve_settings(target):
-    # target will be `010-plex`
-    data = {}
+    The first read for a config loads all of its sections in one query and
+    keeps them on `flask.g`, so the several lookups a step render makes
+    (the page itself, plex, tmdb, notifiarr, gotify, ...) cost one query.
+    Maps section to a (validated, user_entered, data) tuple.
+    """
+    cache = g.setdefault("section_cache", {})
+    stats = g.setdefault("section_cache_stats", {"hits": 0, "misses": 0})
+
+    if name in cache:
+        stats["hits"] += 1
+        _section_cache_totals["hits"] += 1
+    else:
+        stats["misses"] += 1
+        _section_cache_totals["misses"] += 1
+        cache[name] = retrieve_all_sections(name=name)
+
+    return cache[name]
+
+
+def cached_section_data(name, section):
+    # (validated, user_entered, data); all empty for a section never saved
+    return cached_sections(name).get(section, (False, False, None))
+
+
+def invalidate_section_cache(name):
+    g.setdefault("section_cache", {}).pop(name, None)
+
+
+def section_cache_stats():
+    """Hit/miss counts for the current request and for this process overall."""
+    return {
+        "request": dict(g.get("section_cache_stats", {"hits": 0, "misses": 0})),
+        "process": dict(_section_cache_totals),
+    }
 
-    # get source from referrer
-    source, source_name = extract_names(target)
-    # source will be `010-plex`
-    # source_name will be `plex`
 
-    db_data = retrieve_section_data(name=session["config_name"], section=source_name)
+def section_settings(source_name, db_data):
     # db_data is a tuple of validated, user_entered, data
+    data = {}
 
     data["validated"] = booler(db_data[0])
     data["user_entered"] = booler(db_data[1])
@@ -99,6 +141,21 @@ def retrieve_settings(target):
     if not data[source_name]:
         data[source_name] = get_dummy_data(source_name)
 
+    return data
+
+
+def retrieve_settings(target):
+    # target will be `010-plex`
+    # get source from referrer
+    source, source_name = extract_names(target)
+    # source will be `010-plex`
+    # source_name will be `plex`
+
+    db_data = cached_section_data(name=session["config_name"], section=source_name)
+    # db_data is a tuple of validated, user_entered, data
+
+    data = section_settings(source_name, db_data)
+
     data["code_verifier"] = secrets.token_urlsafe(100)[:128]
     data["iso_639_1_languages"] = iso_639_1_languages
     data["iso_3166_1_regions"] = iso_3166_1_regions
@@ -121,6 +178,27 @@ def retrieve_settings(target):
     return data
 
 
+def retrieve_all_settings():
+    # every stored section of the current config
+    # {'plex': {'validated': True, 'user_entered': True, 'plex': {...}}, ...}
+    sections = cached_sections(name=session["config_name"])
+
+    return {
+        source_name: section_settings(source_name, db_data)
+        for source_name, db_data in sections.items()
+    }
+
+
+def retrieve_statuses():
+    # {'plex': (validated, user_entered), ...} for every stored section
+    sections = cached_sections(name=session["config_name"])
+
+    return {
+        source_name: (db_data[0], db_data[1])
+        for source_name, db_data in sections.items()
+    }
+
+
 def retrieve_status(target):
     # target will be `010-plex`
     # get source from referrer
@@ -128,7 +206,7 @@ def retrieve_status(target):
     # source will be `010-plex`
     # source_name will be `plex`
 
-    db_data = retrieve_section_data(name=session["config_name"], section=source_name)
+    db_data = cached_section_data(name=session["config_name"], section=source_name)
     # db_data is a tuple of validated, user_entered, data
 
     validated = booler(db_data[0])
@@ -137,34 +215,44 @@ def retrieve_status(target):
     return validated, user_entered
 
 
-def get_dummy_data(target):
+def get_prototype_config():
+    global _prototype_config
+    # a stat is far cheaper than the pure-Python YAML parse it guards
+    mtime = os.stat(PROTOTYPE_CONFIG_PATH).st_mtime_ns
 
-    yaml = YAML(typ="safe", pure=True)
-    with open("json-schema/prototype_config.yml", "r") as file:
-        base_config = yaml.load(file)
+    cached = _prototype_config
+    if cached is None or cached[0] != mtime:
+        yaml = YAML(typ="safe", pure=True)
+        with open(PROTOTYPE_CONFIG_PATH, "r") as file:
+            cached = (mtime, freeze(yaml.load(file)))
+        _prototype_config = cached
 
-    data = {}
-    try:
-        data = base_config[target]
-    except:
-        data = {}
+    return cached[1]
 
-    return data
+
+def get_dummy_data(target):
+    # callers get their own copy to modify
+    return thaw(get_prototype_config().get(target, {}))
 
 
 def check_minimum_settings():
-    plex_valid, plex_user_entered = retrieve_status("plex")
-    tmdb_valid, tmdb_user_entered = retrieve_status("tmdb")
+    statuses = retrieve_statuses()
+    plex_valid, plex_user_entered = statuses.get("plex", (False, False))
+    tmdb_valid, tmdb_user_entered = statuses.get("tmdb", (False, False))
 
     return plex_valid, tmdb_valid
 
 
 def flush_session_storage():
+    invalidate_section_cache(session["config_name"])
     reset_data(name=session["config_name"])
 
 
 def notification_systems_available():
-    notifiarr_available, notifiarr_user_entered = retrieve_status("notifiarr")
-    gotify_available, gotify_user_entered = retrieve_status("gotify")
+    statuses = retrieve_statuses()
+    notifiarr_available, notifiarr_user_entered = statuses.get(
+        "notifiarr", (False, False)
+    )
+    gotify_available, gotify_user_entered = statuses.get("gotify", (False, False))
 
     return notifiarr_available, gotify_available
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import threading
+import time
+
+from . import upstream
+from .logs import get_logger
+
+logger = get_logger(__name__)
+
+# plexapi makes its own requests, so it needs its own per-call timeout
+PLEX_TIMEOUT = 15  # seconds
+# how long a server handle and what was discovered through it are reused
+SNAPSHOT_TTL = 5 * 60  # seconds
+# the shared users come from plex.tv rather than the server and change rarely
+USERS_TTL = 15 * 60  # seconds
+
+# (url, token hash) -> (expires_at, PlexServer, snapshot); per worker
+_discoveries = {}
+# (url, token hash) -> (expires_at, user names)
+_users = {}
+_discoveries_pid = None
+_discoveries_lock = threading.Lock()
+
+
+def discovery_key(plex_url, plex_token):
+    # the token itself is never kept as a key
+    token_hash = hashlib.sha256(str(plex_token).encode("utf-8")).hexdigest()
+    return str(plex_url).rstrip("/"), token_hash
+
+
+def _cached(cache, key):
+    global _discoveries_pid
+    with _discoveries_lock:
+        # server handles hold connections, which must not cross a fork
+        if _discoveries_pid != os.getpid():
+            _discoveries.clear()
+            _users.clear()
+            _discoveries_pid = os.getpid()
+
+        entry = cache.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            del cache[key]
+            entry = None
+        return entry
+
+
+def get_plex_server(plex_url, plex_token):
+    """A PlexServer for these credentials, reusing the cached handle if there is one."""
+    from plexapi.server import PlexServer
+
+    entry = _cached(_discoveries, discovery_key(plex_url, plex_token))
+    if entry is not None:
+        return entry[1]
+
+    return PlexServer(
+        plex_url,
+        plex_token,
+        session=upstream.session_for(plex_url),
+        timeout=PLEX_TIMEOUT,
+    )
+
+
+def discover_plex(plex_url, plex_token):
+    """
+    Return a snapshot of a Plex server's settings and libraries.
+
+    Only the server itself is asked; see `discover_plex_users` for the
+    plex.tv side. The snapshot and the PlexServer it came from are cached
+    for SNAPSHOT_TTL under the URL and a hash of the token, so validating
+    the same server again (or another step asking about it) doesn't go
+    back to Plex. Raises whatever plexapi raises if the server can't be
+    reached.
+    """
+    key = discovery_key(plex_url, plex_token)
+    entry = _cached(_discoveries, key)
+    if entry is not None:
+        return entry[2]
+
+    plex = get_plex_server(plex_url, plex_token)
+
+    # Retrieve db_cache from Plex settings
+    db_cache = plex.settings.get("DatabaseCacheSize").value
+
+    # If db_cache is None, treat it as invalid
+    if db_cache is None:
+        raise Exception("Unable to retrieve db_cache from Plex settings.")
+
+    # one request for every library, split up here
+    libraries = {"artist": [], "movie": [], "show": []}
+    for section in plex.library.sections():
+        if section.type in libraries:
+            libraries[section.type].append(section.title)
+
+    snapshot = {
+        "db_cache": db_cache,
+        "music_libraries": tuple(libraries["artist"]),
+        "movie_libraries": tuple(libraries["movie"]),
+        "show_libraries": tuple(libraries["show"]),
+        "fetched_at": time.time(),
+    }
+    logger.info(
+        "Discovered Plex server",
+        extra={
+            "fields": {
+                "url": key[0],
+                "libraries": sum(len(titles) for titles in libraries.values()),
+            }
+        },
+    )
+
+    with _discoveries_lock:
+        _discoveries[key] = (time.monotonic() + SNAPSHOT_TTL, plex, snapshot)
+
+    return snapshot
+
+
+def cached_plex_snapshot(plex_url, plex_token):
+    """The snapshot `discover_plex` would return, if it needn't contact Plex; else None."""
+    if not plex_url or not plex_token:
+        return None
+    entry = _cached(_discoveries, discovery_key(plex_url, plex_token))
+    return entry[2] if entry is not None else None
+
+
+def discover_plex_users(plex_url, plex_token):
+    """
+    Return the names of the users the server's owner shares with.
+
+    This goes to plex.tv, which is slow from some networks and sometimes
+    down, so it is kept apart from validating the server and cached on its
+    own for USERS_TTL.
+    """
+    key = discovery_key(plex_url, plex_token)
+    entry = _cached(_users, key)
+    if entry is not None:
+        return entry[1]
+
+    plex = get_plex_server(plex_url, plex_token)
+    # Retrieve user list with only usernames
+    user_list = tuple(user.title for user in plex.myPlexAccount().users())
+
+    with _discoveries_lock:
+        _users[key] = (time.monotonic() + USERS_TTL, user_list)
+
+    return user_list
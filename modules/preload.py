@@ -0,0 +1,24 @@
+from .coercion import get_section_specs
+from .helpers import get_step_registry
+from .output import warm_section_headings
+from .persistence import get_prototype_config
+from .schema import get_schema
+
+
+def preload_shared_data(app):
+    """
+    Build the read-only data every request relies on.
+
+    Under gunicorn with `preload_app` this runs once in the master, so the
+    workers forked from it share these structures copy-on-write instead of
+    each building their own copy. The ISO tables come along with the import
+    of modules.persistence.
+    """
+    get_schema()
+    get_section_specs()
+    get_prototype_config()
+
+    with app.app_context():
+        get_step_registry()
+        # loads pyfiglet and its font once, in the master
+        warm_section_headings()
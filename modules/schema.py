@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from .logs import get_logger
+
+# jsonschema and requests are only needed to validate a config or refresh the
+# schema, so they are imported where used to keep worker startup cheap
+
+logger = get_logger(__name__)
+
+# URL to the JSON schema
+SCHEMA_URL = "https://raw.githubusercontent.com/Kometa-Team/Kometa/nightly/json-schema/config-schema.json"
+
+# Determine the root path of the project directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_DIR = os.path.join(ROOT_DIR, "config")
+BUNDLED_SCHEMA_PATH = os.path.join(ROOT_DIR, "json-schema", "config-schema.json")
+# The last known good copy of the remote schema, along with the ETag and
+# Last-Modified values needed to make conditional requests for it
+CACHED_SCHEMA_PATH = os.path.join(CONFIG_DIR, "config-schema.cache.json")
+
+FETCH_TIMEOUT = (3.05, 10)  # connect, read
+REFRESH_INTERVAL = 6 * 60 * 60  # seconds
+# let the worker finish booting before competing with it for the GIL
+REFRESH_DELAY = 5  # seconds
+
+_current = None
+_validator = None
+_refresh_lock = threading.Lock()
+_refresh_thread = None
+
+
+def _schema_record(schema, source, fetched_at, etag=None, last_modified=None):
+    raw = json.dumps(schema, sort_keys=True).encode("utf-8")
+    return {
+        "schema": schema,
+        "source": source,
+        "version": hashlib.sha256(raw).hexdigest()[:12],
+        "etag": etag,
+        "last_modified": last_modified,
+        "fetched_at": fetched_at,
+        "checked_at": fetched_at,
+    }
+
+
+def _load_cached_record():
+    try:
+        with open(CACHED_SCHEMA_PATH, "r") as file:
+            cached = json.load(file)
+        return _schema_record(
+            cached["schema"],
+            "cache",
+            cached["fetched_at"],
+            etag=cached.get("etag"),
+            last_modified=cached.get("last_modified"),
+        )
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        if not isinstance(error, FileNotFoundError):
+            logger.warning("Ignoring unreadable schema cache: %s", error)
+        return None
+
+
+def _load_bundled_record():
+    with open(BUNDLED_SCHEMA_PATH, "r") as file:
+        schema = json.load(file)
+    return _schema_record(schema, "bundled", os.path.getmtime(BUNDLED_SCHEMA_PATH))
+
+
+def _write_cache(record):
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    # write next to the target and rename over it so readers in other
+    # workers never see a partially written file
+    fd, tmp_path = tempfile.mkstemp(dir=CONFIG_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(
+                {
+                    "schema": record["schema"],
+                    "etag": record["etag"],
+                    "last_modified": record["last_modified"],
+                    "fetched_at": record["fetched_at"],
+                },
+                file,
+            )
+        os.replace(tmp_path, CACHED_SCHEMA_PATH)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def get_schema():
+    """Return the current schema without ever touching the network."""
+    global _current
+    if _current is None:
+        _current = _load_cached_record() or _load_bundled_record()
+    return _current["schema"]
+
+
+def get_schema_version():
+    """A short digest of the current schema, for keying anything derived from it."""
+    get_schema()
+    return _current["version"]
+
+
+def schema_info():
+    """Describe the schema this worker is using; safe to expose in a route."""
+    get_schema()
+    record = _current
+    return {
+        "pid": os.getpid(),
+        "source": record["source"],
+        "version": record["version"],
+        "etag": record["etag"],
+        "last_modified": record["last_modified"],
+        "fetched_at": record["fetched_at"],
+        "checked_at": record["checked_at"],
+        "age_seconds": round(time.time() - record["fetched_at"]),
+    }
+
+
+def get_validator():
+    """
+    Return a validator compiled for the current schema.
+
+    It is built once per schema version and shared by every request in the
+    process, so the meta-schema check and format checker setup are not repeated.
+    """
+    import jsonschema
+
+    global _validator
+    get_schema()
+    record = _current
+    compiled = _validator
+    if compiled is None or compiled[0] != record["version"]:
+        cls = jsonschema.validators.validator_for(record["schema"])
+        cls.check_schema(record["schema"])
+        compiled = (
+            record["version"],
+            cls(record["schema"], format_checker=cls.FORMAT_CHECKER),
+        )
+        _validator = compiled
+    return compiled[1]
+
+
+def validate_config(config):
+    """Validate a config dict, returning every error message in one pass."""
+    errors = sorted(
+        get_validator().iter_errors(config),
+        key=lambda error: [str(part) for part in error.absolute_path],
+    )
+    messages = []
+    for error in errors:
+        path = "/".join(str(part) for part in error.absolute_path) or "<root>"
+        messages.append(f"{path}: {error.message}")
+    return messages
+
+
+def refresh_schema():
+    """
+    Fetch the remote schema if it changed since the copy we hold.
+
+    Returns True if a new schema was swapped in.
+    """
+    import jsonschema
+    import requests
+
+    global _current
+    with _refresh_lock:
+        get_schema()
+        record = _current
+
+        headers = {}
+        # only revalidate what we actually fetched; the bundled copy has no validators
+        if record["source"] != "bundled":
+            if record["etag"]:
+                headers["If-None-Match"] = record["etag"]
+            if record["last_modified"]:
+                headers["If-Modified-Since"] = record["last_modified"]
+
+        try:
+            response = requests.get(SCHEMA_URL, headers=headers, timeout=FETCH_TIMEOUT)
+            if response.status_code == 304:
+                _current = dict(record, checked_at=time.time())
+                return False
+            response.raise_for_status()
+            schema = response.json()
+            jsonschema.validators.validator_for(schema).check_schema(schema)
+        except (requests.RequestException, ValueError) as e:
+            logger.warning("Error fetching the JSON schema: %s", e)
+            return False
+        except jsonschema.exceptions.SchemaError as e:
+            logger.error("Fetched JSON schema is invalid: %s", e)
+            return False
+
+        new_record = _schema_record(
+            schema,
+            "remote",
+            time.time(),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+
+        try:
+            _write_cache(new_record)
+        except OSError as e:
+            logger.error("Error writing the JSON schema cache: %s", e)
+
+        # a single reference assignment, so readers see either the old or the new record
+        _current = new_record
+        # compile here rather than on the next request that needs it
+        get_validator()
+        return True
+
+
+def _refresh_loop(interval, delay):
+    time.sleep(delay)
+    while True:
+        refresh_schema()
+        time.sleep(interval)
+
+
+def start_schema_refresh(interval=REFRESH_INTERVAL, delay=REFRESH_DELAY):
+    """Start refreshing the schema in a daemon thread; a no-op if already running."""
+    global _refresh_thread
+    if _refresh_thread is not None and _refresh_thread.is_alive():
+        return _refresh_thread
+
+    _refresh_thread = threading.Thread(
+        target=_refresh_loop, args=(interval, delay), name="schema-refresh", daemon=True
+    )
+    _refresh_thread.start()
+    return _refresh_thread
@@ -0,0 +1,62 @@
+import io
+import json
+import pickle
+import zlib
+
+# Every stored blob starts with a format byte so rows written by different
+# versions can sit side by side in section_data.
+FORMAT_JSON = b"\x01"
+FORMAT_JSON_ZLIB = b"\x02"
+# pickle protocol 2 and later always starts with the PROTO opcode
+FORMAT_LEGACY_PICKLE = b"\x80"
+
+# Payloads at least this big are compressed; section data is repetitive
+# enough that the fastest level gets nearly all of the savings
+COMPRESS_THRESHOLD = 1024
+COMPRESS_LEVEL = 1
+
+
+class SectionDataError(ValueError):
+    pass
+
+
+class _RestrictedUnpickler(pickle.Unpickler):
+    # Section data only ever held dicts, lists and scalars, none of which
+    # need a class lookup; refusing all lookups keeps pickle.loads from
+    # running arbitrary code out of the database.
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"refusing to load {module}.{name}")
+
+
+def encode_section_data(data):
+    payload = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode(
+        "utf-8"
+    )
+    if len(payload) >= COMPRESS_THRESHOLD:
+        return FORMAT_JSON_ZLIB + zlib.compress(payload, COMPRESS_LEVEL)
+    return FORMAT_JSON + payload
+
+
+def decode_section_data(blob):
+    if blob is None:
+        return None
+    if isinstance(blob, str):
+        blob = blob.encode("utf-8")
+
+    blob = bytes(blob)
+    format_byte = blob[:1]
+    try:
+        if format_byte == FORMAT_JSON:
+            return json.loads(blob[1:])
+        if format_byte == FORMAT_JSON_ZLIB:
+            return json.loads(zlib.decompress(blob[1:]))
+        if format_byte == FORMAT_LEGACY_PICKLE:
+            return _RestrictedUnpickler(io.BytesIO(blob)).load()
+    except (ValueError, EOFError, zlib.error, pickle.UnpicklingError) as error:
+        raise SectionDataError(f"Unreadable section data: {error}") from error
+
+    raise SectionDataError(f"Unknown section data format {format_byte!r}")
+
+
+def is_legacy_section_data(blob):
+    return isinstance(blob, bytes) and blob[:1] == FORMAT_LEGACY_PICKLE
@@ -0,0 +1,236 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .logs import timed
+
+# One keep-alive session per upstream host (Plex, Radarr, api.trakt.tv, ...)
+# and per worker, so the several calls a validator makes to the same host
+# share a connection instead of each paying for TCP and TLS setup.
+
+DEFAULT_TIMEOUT = (3.05, 15)  # connect, read
+# hosts known to answer slowly
+HOST_TIMEOUTS = {
+    "api.anidb.net": (5, 30),
+    "myanimelist.net": (5, 30),
+}
+
+# connections kept open per host; validators for one host run a handful of
+# calls at most, concurrently at worst
+POOL_MAXSIZE = 10
+
+
+class BudgetRetry(Retry):
+    """A Retry that also gives up when another attempt wouldn't fit in the budget."""
+
+    def is_exhausted(self):
+        if super().is_exhausted():
+            return True
+        ends = _budget_ends.get()
+        if ends is None:
+            return False
+        # the backoff sleep comes first, then an attempt as long as this one
+        return (
+            time.monotonic() + self.get_backoff_time() + _attempt_seconds.get() > ends
+        )
+
+
+# idempotent requests are retried on connection errors and gateway errors;
+# anything else (OAuth token exchanges, test messages) only when the
+# connection failed before the request was sent. A 503's Retry-After is not
+# waited for: a validation is better off reporting it than sleeping.
+RETRY = BudgetRetry(
+    total=2,
+    connect=2,
+    read=1,
+    status=2,
+    backoff_factor=0.3,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+    raise_on_status=False,
+    respect_retry_after_header=False,
+)
+
+_sessions = {}
+_sessions_pid = None
+_sessions_lock = threading.Lock()
+
+# the list `recorded_outcomes` is collecting into, if any
+_outcomes = contextvars.ContextVar("upstream_outcomes", default=None)
+# when (time.monotonic()) the calls inside a `budget` block must be done by
+_budget_ends = contextvars.ContextVar("upstream_budget_ends", default=None)
+# the longest the attempt in progress may take; see BudgetRetry
+_attempt_seconds = contextvars.ContextVar("upstream_attempt_seconds", default=0.0)
+
+
+class UpstreamSession(requests.Session):
+    """A requests.Session that applies a default timeout to every request."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.default_timeout = timeout
+
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=RETRY
+        )
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        timeout = kwargs.get("timeout") or self.default_timeout
+        outcomes = _outcomes.get()
+
+        ends = _budget_ends.get()
+        if ends is not None:
+            remaining = ends - time.monotonic()
+            if remaining <= 0:
+                if outcomes is not None:
+                    outcomes.append(None)
+                # the host only: the URL may carry credentials
+                raise requests.Timeout(
+                    f"Out of time for this validation before calling {host_key(url)}"
+                )
+            timeout = budget_timeout(timeout, remaining)
+        kwargs["timeout"] = timeout
+
+        token = _attempt_seconds.set(sum(timeout) if ends is not None else 0.0)
+        with timed("upstream"):
+            try:
+                response = super().request(method, url, **kwargs)
+            except requests.RequestException:
+                if outcomes is not None:
+                    outcomes.append(None)
+                raise
+            finally:
+                _attempt_seconds.reset(token)
+
+        if outcomes is not None:
+            outcomes.append(response.status_code)
+        return response
+
+
+def budget_timeout(timeout, remaining):
+    """`timeout` as a (connect, read) pair, neither longer than `remaining`."""
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+    else:
+        connect = read = timeout
+    return (
+        remaining if connect is None else min(connect, remaining),
+        remaining if read is None else min(read, remaining),
+    )
+
+
+@contextmanager
+def budget(seconds):
+    """
+    Bound the upstream requests made inside the block to `seconds` overall.
+
+    Each request's timeouts are cut to the time left, retries are only made
+    while a whole attempt still fits, and once the time is up requests fail
+    with requests.Timeout without being sent. A nested block can only
+    shorten the budget. Threads started with a copy of the context share it.
+    """
+    ends = time.monotonic() + seconds
+    outer = _budget_ends.get()
+    if outer is not None:
+        ends = min(ends, outer)
+
+    token = _budget_ends.set(ends)
+    try:
+        yield
+    finally:
+        _budget_ends.reset(token)
+
+
+@contextmanager
+def recorded_outcomes():
+    """
+    Collect the outcome of every upstream request made inside the block.
+
+    Yields a list that gets the status code of each response, or None for a
+    request that got no response at all. Threads started with a copy of the
+    context (contextvars.copy_context) report into the same list, and so
+    does any enclosing block.
+    """
+    outcomes = []
+    token = _outcomes.set(outcomes)
+    try:
+        yield outcomes
+    finally:
+        _outcomes.reset(token)
+        enclosing = _outcomes.get()
+        if enclosing is not None:
+            enclosing.extend(outcomes)
+
+
+def host_key(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def session_for(url):
+    """Return this worker's session for the host `url` points at."""
+    global _sessions_pid
+    key = host_key(url)
+
+    with _sessions_lock:
+        # connections must never be shared across a fork
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+
+        session = _sessions.get(key)
+        if session is None:
+            session = UpstreamSession(
+                HOST_TIMEOUTS.get(urlsplit(url).hostname or "", DEFAULT_TIMEOUT)
+            )
+            _sessions[key] = session
+
+    return session
+
+
+def get(url, **kwargs):
+    return session_for(url).get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return session_for(url).post(url, **kwargs)
+
+
+def pool_stats():
+    """
+    Connection reuse per host for this worker.
+
+    `requests` counts requests sent and `connections` the connections opened
+    to send them, so the difference is how many were served by keep-alive.
+    """
+    stats = {}
+
+    with _sessions_lock:
+        sessions = dict(_sessions) if _sessions_pid == os.getpid() else {}
+
+    for key, session in sessions.items():
+        host = {"requests": 0, "connections": 0, "idle": 0}
+        adapter = session.get_adapter(key)
+        pools = adapter.poolmanager.pools
+        for pool_key in pools.keys():
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            host["requests"] += pool.num_requests
+            host["connections"] += pool.num_connections
+            # the queue is padded with None up to its size
+            if pool.pool is not None:
+                host["idle"] += sum(1 for conn in pool.pool.queue if conn)
+        host["reused"] = host["requests"] - host["connections"]
+        stats[key] = host
+
+    return {"pid": os.getpid(), "hosts": stats}
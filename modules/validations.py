@@ -1,18 +1,188 @@
-from flask import jsonify, flash
+import contextvars
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from flask import jsonify, has_request_context
+from flask import flash as flask_flash
 from flask import current_app as app
 from json import JSONDecodeError
-from plexapi.server import PlexServer
 import re
 import requests
 import urllib.parse
 
-import iso639
-import iso3166
+from . import upstream
+from .database import (
+    retrieve_all_sections,
+    retrieve_cached_validation,
+    save_cached_validation,
+    save_sections,
+    validation_cache_entries,
+)
+from .logs import REDACTED, get_logger, is_secret
 
 # TODO: maybe a single entry point here to clean up the imports
 
+logger = get_logger(__name__)
+
+
+def flash(message, category="message"):
+    # validators normally run as background jobs (see modules.jobs), where
+    # there is no session to flash to
+    if has_request_context():
+        flask_flash(message, category)
+
+
+# seconds a successful result is reused, per service. Validations with a side
+# effect (gotify and webhook test messages) or that spend a one-time code
+# (trakt, mal) are never cached.
+VALIDATION_TTLS = {
+    "plex": 5 * 60,
+    "tautulli": 10 * 60,
+    "radarr": 5 * 60,
+    "sonarr": 5 * 60,
+    # AniDB bans clients that ask too often
+    "anidb": 60 * 60,
+    "omdb": 60 * 60,
+    "github": 60 * 60,
+    "tmdb": 60 * 60,
+    "mdblist": 60 * 60,
+    "notifiarr": 60 * 60,
+}
+# rejected credentials are remembered briefly, so a key fixed on the
+# provider's side is picked up soon
+NEGATIVE_TTL = 60
+
+# hits and misses of the validation cache per service, summed over every
+# validation this process has run
+_validation_cache_totals = {}
+
+# the query string of any URL (or path) quoted in a result; errors from
+# requests quote the URL as requested, credentials included (Tautulli)
+URL_QUERY_PATTERN = re.compile(r"""(?<=[^\s?])\?[^\s#'"]*=[^\s#'"]*""")
+# the user:password@ part of a URL quoted in a result
+URL_USERINFO_PATTERN = re.compile(r"""(?<=://)[^/\s@'"]+@""")
+
+
+def validation_cache_key(service, data, url_field=None):
+    url = data.get(url_field) if url_field else None
+    credentials = {k: v for k, v in data.items() if k != url_field}
+    # credentials are only ever stored hashed
+    digest = hashlib.sha256(
+        json.dumps(credentials, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"{service}|{url or ''}|{digest}"
+
+
+def storable_result(result, secrets=()):
+    """
+    A validation result as it may be written to the shared cache.
+
+    Values under secret-looking keys are masked; in text, the submitted
+    `secrets` are masked and URLs lose their query string and credentials.
+    Nothing else is touched, so a cached message reads like the live one.
+    """
+    if isinstance(result, dict):
+        return {
+            key: (
+                REDACTED
+                if is_secret(key) and value not in (None, "")
+                else storable_result(value, secrets)
+            )
+            for key, value in result.items()
+        }
+    if isinstance(result, list):
+        return [storable_result(item, secrets) for item in result]
+    if isinstance(result, str):
+        for secret in secrets:
+            result = result.replace(secret, REDACTED)
+        result = URL_USERINFO_PATTERN.sub("", result)
+        return URL_QUERY_PATTERN.sub("", result)
+    return result
+
+
+def cached_validation(service, url_field=None):
+    """
+    Cache a validator's result in SQLite, where every worker can reuse it.
+
+    Results are keyed by service, URL and a hash of the credentials. A
+    successful one is kept for the service's TTL; a failure is kept for
+    NEGATIVE_TTL, but only when every upstream request got a definite
+    answer (no connection errors, 5xx or 429) - i.e. the credentials were
+    rejected, rather than the service being unreachable. Stored results go
+    through `storable_result`, as failure messages can quote the
+    credentials (in a query string, or in the path for Notifiarr).
+    """
+
+    def decorator(validator):
+        @wraps(validator)
+        def wrapper(data):
+            key = validation_cache_key(service, data, url_field)
+            totals = _validation_cache_totals.setdefault(
+                service, {"hits": 0, "misses": 0}
+            )
+
+            cached = retrieve_cached_validation(key)
+            if cached is not None:
+                totals["hits"] += 1
+                status_code, result = cached
+                return jsonify(result), status_code
+            totals["misses"] += 1
+
+            with upstream.recorded_outcomes() as outcomes:
+                rv = validator(data)
+
+            response, status_code = rv if isinstance(rv, tuple) else (rv, 200)
+            result = response.get_json()
+            valid = bool(result.get("valid", result.get("validated")))
+
+            if valid and not result.get("errors"):
+                ttl = VALIDATION_TTLS[service]
+            elif (
+                not valid
+                and outcomes
+                and all(
+                    code is not None and code < 500 and code != 429 for code in outcomes
+                )
+            ):
+                ttl = NEGATIVE_TTL
+            else:
+                ttl = None
+
+            if ttl:
+                # nothing the user submitted is kept in the clear
+                secrets = [
+                    str(value)
+                    for field, value in data.items()
+                    if is_secret(field) and value not in (None, "")
+                ]
+                stored = storable_result(result, secrets)
+                save_cached_validation(key, service, valid, status_code, stored, ttl)
+
+            return rv
+
+        return wrapper
+
+    return decorator
+
+
+def validation_cache_stats():
+    """Hit rates for this process, and the entries every worker shares."""
+    process = {}
+    for service, totals in _validation_cache_totals.items():
+        lookups = totals["hits"] + totals["misses"]
+        process[service] = dict(
+            totals, hit_rate=round(totals["hits"] / lookups, 3) if lookups else None
+        )
+    return {"process": process, "shared": validation_cache_entries()}
+
 
 def validate_iso3166_1(code):
+    import iso3166
+
     try:
         country = iso3166.countries.get(code.upper())
         if country:
@@ -24,62 +194,43 @@ def validate_iso3166_1(code):
 
 
 def validate_iso639_1(code):
+    import iso639
+
     if len(code) == 2 and iso639.languages.get(alpha2=code.lower()):
         return code.lower()
     return None
 
 
+@cached_validation("plex", url_field="plex_url")
 def validate_plex_server(data):
+    from .plex_discovery import discover_plex
+
     plex_url = data.get("plex_url")
     plex_token = data.get("plex_token")
 
     # Validate Plex URL and Token
     try:
-        plex = PlexServer(plex_url, plex_token)
-
-        # Fetch Plex settings
-        srv_settings = plex.settings
-
-        # Retrieve db_cache from Plex settings
-        db_cache_setting = srv_settings.get("DatabaseCacheSize")
-
-        # Get the value of db_cache
-        db_cache = db_cache_setting.value
-
-        # Log db_cache value
-        app.logger.info(f"db_cache returned from Plex: {db_cache}")
-
-        # If db_cache is None, treat it as invalid
-        if db_cache is None:
-            raise Exception("Unable to retrieve db_cache from Plex settings.")
-
-        # Retrieve user list with only usernames
-        user_list = [user.title for user in plex.myPlexAccount().users()]
-        app.logger.info(f"User list retrieved from Plex: {user_list}")
-
-        # Retrieve library sections
-        music_libraries = [
-            section.title
-            for section in plex.library.sections()
-            if section.type == "artist"
-        ]
-        movie_libraries = [
-            section.title
-            for section in plex.library.sections()
-            if section.type == "movie"
-        ]
-        show_libraries = [
-            section.title
-            for section in plex.library.sections()
-            if section.type == "show"
-        ]
-
-        app.logger.info(f"Music libraries: {music_libraries}")
-        app.logger.info(f"Movie libraries: {movie_libraries}")
-        app.logger.info(f"Show libraries: {show_libraries}")
+        snapshot = discover_plex(plex_url, plex_token)
+
+        db_cache = snapshot["db_cache"]
+        music_libraries = list(snapshot["music_libraries"])
+        movie_libraries = list(snapshot["movie_libraries"])
+        show_libraries = list(snapshot["show_libraries"])
+
+        logger.info(
+            "Plex server validated",
+            extra={
+                "fields": {
+                    "db_cache": db_cache,
+                    "music_libraries": music_libraries,
+                    "movie_libraries": movie_libraries,
+                    "show_libraries": show_libraries,
+                }
+            },
+        )
 
     except Exception as e:
-        app.logger.error(f"Error validating Plex server: {str(e)}")
+        logger.error("Error validating Plex server: %s", e)
         flash(f"Invalid Plex URL or Token: {str(e)}", "error")
         return jsonify(
             {"valid": False, "error": f"Invalid Plex URL or Token: {str(e)}"}
@@ -90,7 +241,6 @@ def validate_plex_server(data):
         {
             "validated": True,
             "db_cache": db_cache,  # Send back the integer value of db_cache
-            "user_list": user_list,
             "music_libraries": music_libraries,
             "movie_libraries": movie_libraries,
             "show_libraries": show_libraries,
@@ -98,6 +248,27 @@ def validate_plex_server(data):
     )
 
 
+def fetch_plex_users(data):
+    from .plex_discovery import discover_plex_users
+
+    plex_url = data.get("plex_url")
+    plex_token = data.get("plex_token")
+
+    try:
+        user_list = list(discover_plex_users(plex_url, plex_token))
+        logger.info("User list retrieved from Plex: %s", user_list)
+
+    except Exception as e:
+        # the server itself may still be fine; this only loses the user list
+        logger.error("Error retrieving Plex users: %s", e)
+        return jsonify(
+            {"valid": False, "error": f"Unable to load Plex users: {str(e)}"}
+        )
+
+    return jsonify({"valid": True, "user_list": user_list})
+
+
+@cached_validation("tautulli", url_field="tautulli_url")
 def validate_tautulli_server(data):
     tautulli_url = data.get("tautulli_url")
     tautulli_apikey = data.get("tautulli_apikey")
@@ -106,7 +277,7 @@ def validate_tautulli_server(data):
     params = {"apikey": tautulli_apikey, "cmd": "get_tautulli_info"}
 
     try:
-        response = requests.get(api_url, params=params)
+        response = upstream.get(api_url, params=params)
 
         # Raise an exception for HTTP errors
         response.raise_for_status()
@@ -116,12 +287,12 @@ def validate_tautulli_server(data):
         isValid = data.get("response", {}).get("result") == "success"
         # Check if the response contains the expected data
         if isValid:
-            app.logger.info(f"Tautulli connection successful.")
+            logger.info("Tautulli connection successful.")
         else:
-            app.logger.error(f"Tautulli connection failed.")
+            logger.error("Tautulli connection failed.")
 
     except requests.exceptions.RequestException as e:
-        print(f"Error validating Tautulli connection: {e}")
+        logger.warning("Error validating Tautulli connection: %s", e)
         flash(f"Invalid Tautulli URL or API Key: {str(e)}", "error")
         return jsonify(
             {"valid": False, "error": f"Invalid Tautulli URL or Apikey: {str(e)}"}
@@ -156,7 +327,7 @@ def validate_trakt_server(data):
         "grant_type": "authorization_code",
     }
     try:
-        response = requests.post(
+        response = upstream.post(
             f"{base_url}/oauth/token",
             json=json,
             headers={"Content-Type": "application/json"},
@@ -177,7 +348,7 @@ def validate_trakt_server(data):
                 "trakt-api-key": trakt_client_id,
             }
 
-            validation_response = requests.get(
+            validation_response = upstream.get(
                 f"{base_url}/users/settings", headers=headers
             )
 
@@ -198,7 +369,7 @@ def validate_trakt_server(data):
                 isValid = True
 
     except requests.exceptions.RequestException as e:
-        print(f"Error validating Trakt connection: {e}")
+        logger.warning("Error validating Trakt connection: %s", e)
         flash(f"Invalid Trakt ID, Secret, or PIN: {str(e)}", "error")
         return jsonify(
             {"valid": False, "error": f"Invalid Trakt ID, Secret, or PIN: {str(e)}"}
@@ -225,7 +396,7 @@ def validate_gotify_server(data):
     gotify_url = gotify_url.rstrip("#")
     gotify_url = gotify_url.rstrip("/")
 
-    response = requests.get(f"{gotify_url}/version")
+    response = upstream.get(f"{gotify_url}/version")
 
     try:
         response_json = response.json()
@@ -242,7 +413,7 @@ def validate_gotify_server(data):
 
     json = {"message": "Kometa Test Message", "title": "Kometa Test"}
 
-    response = requests.post(
+    response = upstream.post(
         f"{gotify_url}/message", headers={"X-Gotify-Key": gotify_token}, json=json
     )
 
@@ -280,8 +451,7 @@ def validate_mal_server(data):
             "grant_type": "authorization_code",
         }
 
-        session = requests.Session()
-        new_authorization = session.post(
+        new_authorization = upstream.post(
             "https://myanimelist.net/v1/oauth2/token", data=data
         ).json()
 
@@ -306,6 +476,7 @@ def validate_mal_server(data):
     )
 
 
+@cached_validation("anidb")
 def validate_anidb_server(data):
     username = data.get("username")
     password = data.get("password")
@@ -335,7 +506,7 @@ def validate_anidb_server(data):
         full_url = f"{api_url}?request=hints&user={username}&pass={safe_password}&protover=1&client={client}&clientver={clientver}&type=1"
 
         # Make a GET request to AniDB API
-        response = requests.get(api_url, params=params)
+        response = upstream.get(api_url, params=params)
         response_text = response.text
 
         # Check if the response contains 'hints'
@@ -378,7 +549,7 @@ def validate_webhook_server(data):
 
     message_data = {"content": message}
 
-    response = requests.post(webhook_url, json=message_data)
+    response = upstream.post(webhook_url, json=message_data)
 
     if response.status_code == 204:
         return (
@@ -400,115 +571,115 @@ def validate_webhook_server(data):
         )
 
 
-def validate_radarr_server(data):
-    radarr_url = data.get("radarr_url")
-    radarr_apikey = data.get("radarr_token")
+def fetch_arr_resources(arr_url, arr_apikey, resources):
+    """
+    Fetch several Radarr/Sonarr API resources at once.
 
-    status_api_url = f"{radarr_url}/api/v3/system/status?apikey={radarr_apikey}"
-    root_folder_api_url = f"{radarr_url}/api/v3/rootfolder?apikey={radarr_apikey}"
-    quality_profile_api_url = (
-        f"{radarr_url}/api/v3/qualityprofile?apikey={radarr_apikey}"
-    )
+    `resources` maps result key to API path. Returns (results, errors): a
+    resource that failed comes back as an empty list, with its error in
+    `errors`, so one slow or broken endpoint doesn't sink the others.
+    """
+    # in a header rather than the query string, so it stays out of errors
+    headers = {"X-Api-Key": arr_apikey}
 
-    try:
-        # Validate API key by checking system status
-        response = requests.get(status_api_url)
+    def fetch(path):
+        response = upstream.get(f"{arr_url}/api/v3/{path}", headers=headers)
         response.raise_for_status()
-        status_data = response.json()
+        return response.json()
 
-        if "version" not in status_data:
-            app.logger.error("Radarr connection failed. Invalid response data.")
-            return jsonify({"valid": False, "error": "Invalid Radarr URL or Apikey"})
+    results = {}
+    errors = {}
 
-        # Fetch root folders
-        response = requests.get(root_folder_api_url)
-        response.raise_for_status()
-        root_folders = response.json()
+    with ThreadPoolExecutor(max_workers=len(resources)) as executor:
+        # each in a copy of this context, so upstream outcomes are still recorded
+        futures = {
+            key: executor.submit(contextvars.copy_context().run, fetch, path)
+            for key, path in resources.items()
+        }
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                results[key] = []
+                errors[key] = str(e)
 
-        # Fetch quality profiles
-        response = requests.get(quality_profile_api_url)
-        response.raise_for_status()
-        quality_profiles = response.json()
+    return results, errors
 
-        app.logger.info("Radarr connection successful.")
 
-        return jsonify(
-            {
-                "valid": True,
-                "root_folders": root_folders,
-                "quality_profiles": quality_profiles,
-            }
+def validate_arr_server(arr_name, arr_url, arr_apikey, resources):
+    try:
+        # Validate API key by checking system status; nothing else is worth
+        # fetching if this fails
+        response = upstream.get(
+            f"{arr_url}/api/v3/system/status", headers={"X-Api-Key": arr_apikey}
         )
+        response.raise_for_status()
+        status_data = response.json()
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error validating Radarr connection: {e}")
-        flash(f"Invalid Radarr URL or API Key: {str(e)}", "error")
+        if "version" not in status_data:
+            logger.error("%s connection failed. Invalid response data.", arr_name)
+            return jsonify(
+                {"valid": False, "error": f"Invalid {arr_name} URL or Apikey"}
+            )
+
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning("Error validating %s connection: %s", arr_name, e)
+        flash(f"Invalid {arr_name} URL or API Key: {str(e)}", "error")
         return jsonify(
-            {"valid": False, "error": f"Invalid Radarr URL or Apikey: {str(e)}"}
+            {"valid": False, "error": f"Invalid {arr_name} URL or Apikey: {str(e)}"}
         )
 
+    # the rest only depend on the key being good, so ask for them together
+    results, errors = fetch_arr_resources(arr_url, arr_apikey, resources)
 
-def validate_sonarr_server(data):
-    sonarr_url = data.get("sonarr_url")
-    sonarr_apikey = data.get("sonarr_token")
-
-    status_api_url = f"{sonarr_url}/api/v3/system/status?apikey={sonarr_apikey}"
-    root_folder_api_url = f"{sonarr_url}/api/v3/rootfolder?apikey={sonarr_apikey}"
-    quality_profile_api_url = (
-        f"{sonarr_url}/api/v3/qualityprofile?apikey={sonarr_apikey}"
-    )
-    language_profile_api_url = f"{sonarr_url}/api/v3/language?apikey={sonarr_apikey}"
+    if errors:
+        logger.error("%s connection partially failed: %s", arr_name, errors)
+    else:
+        logger.info("%s connection successful.", arr_name)
 
-    try:
-        # Validate API key by checking system status
-        response = requests.get(status_api_url)
-        response.raise_for_status()
-        status_data = response.json()
+    return jsonify({"valid": True, **results, "errors": errors})
 
-        if "version" not in status_data:
-            app.logger.error("Sonarr connection failed. Invalid response data.")
-            return jsonify({"valid": False, "error": "Invalid Sonarr URL or Apikey"})
 
-        # Fetch root folders
-        response = requests.get(root_folder_api_url)
-        response.raise_for_status()
-        root_folders = response.json()
-
-        # Fetch quality profiles
-        response = requests.get(quality_profile_api_url)
-        response.raise_for_status()
-        quality_profiles = response.json()
+@cached_validation("radarr", url_field="radarr_url")
+def validate_radarr_server(data):
+    radarr_url = data.get("radarr_url")
+    radarr_apikey = data.get("radarr_token")
 
-        # Fetch quality profiles
-        response = requests.get(language_profile_api_url)
-        response.raise_for_status()
-        language_profiles = response.json()
+    return validate_arr_server(
+        "Radarr",
+        radarr_url,
+        radarr_apikey,
+        {
+            "root_folders": "rootfolder",
+            "quality_profiles": "qualityprofile",
+        },
+    )
 
-        app.logger.info("Sonarr connection successful.")
 
-        return jsonify(
-            {
-                "valid": True,
-                "root_folders": root_folders,
-                "quality_profiles": quality_profiles,
-                "language_profiles": language_profiles,
-            }
-        )
+@cached_validation("sonarr", url_field="sonarr_url")
+def validate_sonarr_server(data):
+    sonarr_url = data.get("sonarr_url")
+    sonarr_apikey = data.get("sonarr_token")
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error validating Sonarr connection: {e}")
-        flash(f"Invalid Sonarr URL or API Key: {str(e)}", "error")
-        return jsonify(
-            {"valid": False, "error": f"Invalid Sonarr URL or Apikey: {str(e)}"}
-        )
+    return validate_arr_server(
+        "Sonarr",
+        sonarr_url,
+        sonarr_apikey,
+        {
+            "root_folders": "rootfolder",
+            "quality_profiles": "qualityprofile",
+            "language_profiles": "language",
+        },
+    )
 
 
+@cached_validation("omdb")
 def validate_omdb_server(data):
     omdb_apikey = data.get("omdb_apikey")
 
     api_url = f"http://www.omdbapi.com/?apikey={omdb_apikey}&s=test"
     try:
-        response = requests.get(api_url)
+        response = upstream.get(api_url)
         data = response.json()
         if data.get("Response") == "True" or data.get("Error") == "Movie not found!":
             return jsonify({"valid": True, "message": "OMDb API key is valid"})
@@ -517,11 +688,12 @@ def validate_omdb_server(data):
                 {"valid": False, "message": data.get("Error", "Invalid API key")}
             )
     except Exception as e:
-        print(f"Error validating OMDb connection: {e}")
+        logger.warning("Error validating OMDb connection: %s", e)
         flash(f"Invalid OMDb API Key: {str(e)}", "error")
         return jsonify({"valid": False, "message": str(e)})
 
 
+@cached_validation("github")
 def validate_github_server(data):
     github_token = data.get("github_token")
 
@@ -531,7 +703,7 @@ def validate_github_server(data):
         "Accept": "application/vnd.github.v3+json",
     }
     try:
-        response = requests.get(api_url, headers=headers)
+        response = upstream.get(api_url, headers=headers)
         if response.status_code == 200:
             user_data = response.json()
             return jsonify(
@@ -546,11 +718,12 @@ def validate_github_server(data):
         return jsonify({"valid": False, "message": str(e)})
 
 
+@cached_validation("tmdb")
 def validate_tmdb_server(data):
     api_key = data.get("tmdb_apikey")
 
     # Validate the API key
-    movie_response = requests.get(
+    movie_response = upstream.get(
         f"https://api.themoviedb.org/3/movie/550?api_key={api_key}"
     )
     if movie_response.status_code == 200:
@@ -559,21 +732,188 @@ def validate_tmdb_server(data):
         return jsonify({"valid": False, "message": "Invalid API key"})
 
 
+@cached_validation("mdblist")
 def validate_mdblist_server(data):
     api_key = data.get("mdblist_apikey")
 
-    response = requests.get(f"https://mdblist.com/api/?apikey={api_key}&s=test")
+    response = upstream.get(f"https://mdblist.com/api/?apikey={api_key}&s=test")
     if response.status_code == 200 and response.json().get("response") == True:
         return jsonify({"valid": True, "message": "API key is valid!"})
     else:
         return jsonify({"valid": False, "message": "Invalid API key"})
 
 
+@cached_validation("notifiarr")
 def validate_notifiarr_server(data):
     api_key = data.get("notifiarr_apikey")
 
-    response = requests.get(f"https://notifiarr.com/api/v1/user/validate/{api_key}")
+    response = upstream.get(f"https://notifiarr.com/api/v1/user/validate/{api_key}")
     if response.status_code == 200 and response.json().get("result") == "success":
         return jsonify({"valid": True, "message": "API key is valid!"})
     else:
         return jsonify({"valid": False, "message": "Invalid API key"})
+
+
+# validator and how to build its input from a stored section, for every
+# section validate_all can re-check on its own
+SECTION_VALIDATORS = {
+    "plex": (
+        validate_plex_server,
+        lambda d: {"plex_url": d.get("url"), "plex_token": d.get("token")},
+    ),
+    "tmdb": (validate_tmdb_server, lambda d: {"tmdb_apikey": d.get("apikey")}),
+    "tautulli": (
+        validate_tautulli_server,
+        lambda d: {"tautulli_url": d.get("url"), "tautulli_apikey": d.get("apikey")},
+    ),
+    "github": (validate_github_server, lambda d: {"github_token": d.get("token")}),
+    "omdb": (validate_omdb_server, lambda d: {"omdb_apikey": d.get("apikey")}),
+    "mdblist": (
+        validate_mdblist_server,
+        lambda d: {"mdblist_apikey": d.get("apikey")},
+    ),
+    "notifiarr": (
+        validate_notifiarr_server,
+        lambda d: {"notifiarr_apikey": d.get("apikey")},
+    ),
+    "anidb": (
+        validate_anidb_server,
+        lambda d: {
+            "username": d.get("username"),
+            "password": d.get("password"),
+            "client": d.get("client"),
+            "clientver": d.get("version"),
+        },
+    ),
+    "radarr": (
+        validate_radarr_server,
+        lambda d: {"radarr_url": d.get("url"), "radarr_token": d.get("token")},
+    ),
+    "sonarr": (
+        validate_sonarr_server,
+        lambda d: {"sonarr_url": d.get("url"), "sonarr_token": d.get("token")},
+    ),
+}
+# sections that can only be validated from their page
+UNATTENDED_SKIPS = {
+    "gotify": "validating sends a test message",
+    "webhooks": "validating sends a test message",
+    "trakt": "needs a new PIN from Trakt",
+    "mal": "needs a new authorization code from MyAnimeList",
+}
+
+# validators validate_all runs at once in this worker, across every request;
+# each gunicorn worker has its own slots, so the server as a whole may run
+# this many times its worker count
+VALIDATE_ALL_CONCURRENCY = int(os.getenv("QUICKSTART_VALIDATE_ALL_CONCURRENCY", "4"))
+_validate_all_slots = threading.BoundedSemaphore(VALIDATE_ALL_CONCURRENCY)
+
+
+def run_section_validator(flask_app, section, validator, data):
+    """
+    Run one validator for validate_all; returns its entry in the report.
+
+    The section is "unreachable" when any upstream call it made got no
+    response, a 5xx or a 429: none of those says anything about the
+    settings, the same rule the negative validation cache uses. It is
+    "invalid" only when every call was answered and the answer was no.
+    """
+    with _validate_all_slots, flask_app.app_context():
+        start = time.perf_counter()
+        try:
+            with upstream.recorded_outcomes() as outcomes:
+                rv = validator(data)
+            response, status_code = rv if isinstance(rv, tuple) else (rv, 200)
+            result = response.get_json()
+        except Exception as e:
+            logger.error("Error validating %s: %s", section, e)
+            outcomes = [None]
+            status_code, result = 500, {"valid": False, "error": str(e)}
+
+        if result.get("valid", result.get("validated")):
+            status = "valid"
+        elif all(code is not None and code < 500 and code != 429 for code in outcomes):
+            # every call was answered and the answer was no (or it was cached)
+            status = "invalid"
+        else:
+            status = "unreachable"
+
+        return {
+            "status": status,
+            "status_code": status_code,
+            "message": result.get("error") or result.get("message"),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+
+def validate_all_sections(data):
+    """
+    Re-validate every stored section of a config at once.
+
+    Validators run concurrently (at most VALIDATE_ALL_CONCURRENCY at a time
+    per worker, not across workers), so this takes about as long as the
+    slowest service. Each section's validated flag is saved from the
+    outcome - except for unreachable services (see run_section_validator),
+    whose flag is left alone.
+    """
+    config_name = data.get("config_name")
+    start = time.perf_counter()
+
+    sections = retrieve_all_sections(config_name)
+    report = {}
+    tasks = {}
+
+    for section, (validated, user_entered, section_data) in sections.items():
+        fields = (section_data or {}).get(section)
+        if section in UNATTENDED_SKIPS:
+            report[section] = {
+                "status": "skipped",
+                "message": UNATTENDED_SKIPS[section],
+            }
+        elif section in SECTION_VALIDATORS and user_entered and fields:
+            validator, build_input = SECTION_VALIDATORS[section]
+            tasks[section] = (validator, build_input(fields))
+
+    if tasks:
+        flask_app = app._get_current_object()
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            futures = {
+                section: executor.submit(
+                    contextvars.copy_context().run,
+                    run_section_validator,
+                    flask_app,
+                    section,
+                    validator,
+                    validator_input,
+                )
+                for section, (validator, validator_input) in tasks.items()
+            }
+            for section, future in futures.items():
+                report[section] = future.result()
+
+    # persist the new flags in one transaction
+    updates = {}
+    for section, entry in report.items():
+        if entry["status"] not in ("valid", "invalid"):
+            continue
+        validated, user_entered, section_data = sections[section]
+        valid = entry["status"] == "valid"
+        if valid != validated:
+            updates[section] = (
+                valid,
+                user_entered,
+                dict(section_data, validated=valid),
+            )
+    save_sections(config_name, updates)
+
+    checked = [entry for entry in report.values() if entry["status"] != "skipped"]
+    return jsonify(
+        {
+            "valid": bool(checked)
+            and all(entry["status"] == "valid" for entry in checked),
+            "config_name": config_name,
+            "services": report,
+            "updated": sorted(updates),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+    )
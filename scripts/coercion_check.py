@@ -0,0 +1,118 @@
+"""
+Check the form coercion rules against the bundled JSON schema.
+
+Submits representative values for real schema fields (booleans, integers,
+nulls, lists, enums) and a few synthetic ones, and fails on the first value
+that doesn't come out as expected.
+
+    python scripts/coercion_check.py
+"""
+
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from modules.coercion import (
+    DEFAULT_RUN_ORDER,
+    UNKNOWN_FIELD,
+    VALIDATED_FIELD,
+    FieldSpec,
+    coerce_form,
+    coerce_value,
+    get_section_specs,
+)
+
+# (section, field, submitted, expected)
+CASES = [
+    # booleans
+    ("plex", "verify_ssl", "true", True),
+    ("plex", "verify_ssl", "on", True),
+    ("plex", "verify_ssl", "False", False),
+    # integers, and the text of a field that may be either
+    ("plex", "timeout", "60", 60),
+    ("plex", "timeout", " -5 ", -5),
+    ("plex", "db_cache", "4096", 4096),
+    ("plex", "db_cache", "4 GB", "4 GB"),
+    # nulls
+    ("settings", "tvdb_language", "None", None),
+    ("settings", "custom_repo", "", None),
+    ("plex", "timeout", "", None),
+    # lists, unless the field also takes a plain string
+    ("settings", "run_order", "operations, metadata", ["operations", "metadata"]),
+    ("settings", "run_order", "overlays collections", ["overlays", "collections"]),
+    ("settings", "asset_directory", "config/assets", "config/assets"),
+    # enums take the schema's spelling; anything else is kept for validation
+    ("radarr", "availability", "Released", "released"),
+    ("settings", "sync_mode", "APPEND", "append"),
+    ("tmdb", "region", "us", "US"),
+    ("radarr", "availability", "someday", "someday"),
+    # strings are kept as submitted
+    ("plex", "url", "http://192.168.1.12:32400", "http://192.168.1.12:32400"),
+]
+
+SYNTHETIC_CASES = [
+    (FieldSpec(frozenset(("integer",)), default=100), "", 100),
+    (FieldSpec(frozenset(("integer",)), default=100), "25", 25),
+    (FieldSpec(frozenset(("number",))), "2.5", 2.5),
+    (FieldSpec(frozenset(("array",)), items=UNKNOWN_FIELD), "1, 2 true", [1, 2, True]),
+    (UNKNOWN_FIELD, "7", 7),
+    (UNKNOWN_FIELD, "off", "off"),
+    (VALIDATED_FIELD, "true", True),
+    # values that aren't form text are left alone
+    (UNKNOWN_FIELD, 3, 3),
+]
+
+
+def check(label, actual, expected):
+    if actual != expected or type(actual) is not type(expected):
+        raise AssertionError(f"{label}: expected {expected!r}, got {actual!r}")
+
+
+def main():
+    specs = get_section_specs()
+    for section, field, submitted, expected in CASES:
+        actual = coerce_value(submitted, specs[section][field])
+        check(f"{section}.{field} = {submitted!r}", actual, expected)
+
+    for spec, submitted, expected in SYNTHETIC_CASES:
+        check(f"{spec!r} = {submitted!r}", coerce_value(submitted, spec), expected)
+
+    form = {
+        "settings_run_order": "",
+        "settings_cache_expiration": "60",
+        "validated": "true",
+    }
+    check(
+        "settings form",
+        coerce_form("settings", form),
+        {
+            "settings": {"run_order": DEFAULT_RUN_ORDER, "cache_expiration": 60},
+            "validated": True,
+        },
+    )
+
+    form = {
+        "trakt_client_id": "abc",
+        "trakt_pin": "1234",
+        "trakt_expires_in": "7889238",
+        "trakt_url": "https://trakt.tv",
+    }
+    check(
+        "trakt form",
+        coerce_form("trakt", form),
+        {
+            "trakt": {
+                "authorization": {"expires_in": 7889238},
+                "client_id": "abc",
+                "pin": "1234",
+            }
+        },
+    )
+
+    print(f"OK: {len(CASES) + len(SYNTHETIC_CASES) + 2} checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Compare per-worker memory with and without gunicorn's preload_app.
+
+For each worker count, starts gunicorn with gunicorn.conf.py twice (with
+QUICKSTART_PRELOAD on and off), sends a few requests so every worker has
+served a page, then reads /proc/<pid>/smaps_rollup for the master and its
+workers. Linux only.
+
+    python scripts/preload_memory.py --workers 1 2 4 8
+
+RSS counts shared pages in every process, so it barely moves; USS (private
+memory per worker) and the total PSS across master and workers show what
+preloading actually saves.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def memory_kb(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def worker_pids(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children", "r") as file:
+        return [int(pid) for pid in file.read().split()]
+
+
+def measure(workers, preload, requests_per_worker):
+    port = free_port()
+    env = dict(os.environ, QUICKSTART_PRELOAD="true" if preload else "false")
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "app:app",
+            "-c",
+            "gunicorn.conf.py",
+            "-b",
+            f"127.0.0.1:{port}",
+            "-w",
+            str(workers),
+        ],
+        cwd=ROOT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + 60
+        while len(worker_pids(server.pid)) < workers:
+            if time.time() > deadline:
+                raise SystemExit("gunicorn did not start its workers in time")
+            time.sleep(0.2)
+
+        # the final page touches the schema, prototype config and step registry
+        for _ in range(workers * requests_per_worker):
+            for path in ("/step/001-start", "/step/900-final"):
+                while True:
+                    try:
+                        urllib.request.urlopen(f"http://127.0.0.1:{port}{path}").read()
+                        break
+                    except OSError:
+                        if time.time() > deadline:
+                            raise
+                        time.sleep(0.2)
+
+        master = memory_kb(server.pid)
+        per_worker = [memory_kb(pid) for pid in worker_pids(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    return {
+        "rss": sum(m["rss"] for m in per_worker) / len(per_worker),
+        "uss": sum(m["uss"] for m in per_worker) / len(per_worker),
+        "pss_total": master["pss"] + sum(m["pss"] for m in per_worker),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests-per-worker", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{'workers':>7}  {'mode':>10}  {'RSS/worker':>10}  {'USS/worker':>10}  "
+        f"{'total PSS':>10}  {'saved':>8}"
+    )
+    for workers in args.workers:
+        results = {}
+        for preload in (False, True):
+            results[preload] = measure(workers, preload, args.requests_per_worker)
+
+        saved = results[False]["pss_total"] - results[True]["pss_total"]
+        for preload in (False, True):
+            result = results[preload]
+            print(
+                f"{workers:>7}  {'preload' if preload else 'no preload':>10}  "
+                f"{result['rss'] / 1024:>8.1f}MB  {result['uss'] / 1024:>8.1f}MB  "
+                f"{result['pss_total'] / 1024:>8.1f}MB  "
+                f"{(saved / 1024 if preload else 0):>6.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
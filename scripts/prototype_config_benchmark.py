@@ -0,0 +1,64 @@
+"""
+Show what caching json-schema/prototype_config.yml saves per page view.
+
+Times the old get_dummy_data (a full pure-Python YAML parse per call)
+against the cached one (an mtime check plus a copy of one section). A step
+render calls it once from save_settings and once for each section it
+reads that has nothing stored yet, so a first visit to a page typically
+makes two or three calls.
+
+    python scripts/prototype_config_benchmark.py
+"""
+
+import os
+import sys
+import timeit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from ruamel.yaml import YAML
+
+from modules.persistence import PROTOTYPE_CONFIG_PATH, get_dummy_data
+
+SECTIONS = ("plex", "tmdb", "settings", "trakt")
+CALLS_PER_REQUEST = 3
+
+
+def uncached_dummy_data(target):
+    # what get_dummy_data did before the cache
+    yaml = YAML(typ="safe", pure=True)
+    with open(PROTOTYPE_CONFIG_PATH, "r") as file:
+        base_config = yaml.load(file)
+    return base_config.get(target, {})
+
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    for section in SECTIONS:
+        assert uncached_dummy_data(section) == get_dummy_data(section)
+
+    print(f"{'section':<10} {'uncached':>12} {'cached':>10} {'speedup':>9}")
+    uncached_total = 0
+    cached_total = 0
+    for section in SECTIONS:
+        uncached_us = per_call_us(lambda: uncached_dummy_data(section), 5)
+        cached_us = per_call_us(lambda: get_dummy_data(section), 5000)
+        uncached_total += uncached_us
+        cached_total += cached_us
+        print(
+            f"{section:<10} {uncached_us / 1000:>10.2f}ms {cached_us:>8.1f}us "
+            f"{uncached_us / cached_us:>8.0f}x"
+        )
+
+    saved_ms = (
+        (uncached_total - cached_total) / len(SECTIONS) * CALLS_PER_REQUEST / 1000
+    )
+    print(f"saved per request ({CALLS_PER_REQUEST} calls): ~{saved_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Check that secrets are masked in what the quickstart loggers write.
+
+Logs representative messages through the handler `configure_logging`
+installs and fails on the first line that is mis-formatted or still holds
+a secret.
+
+    python scripts/redaction_check.py
+"""
+
+import io
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from modules.logs import REDACTED, configure_logging, get_logger
+
+SECRET = "2PxWuxX_NydKLKKEt3Z2"
+
+# (message, args, extra, text expected in the line)
+CASES = [
+    # a secret-looking prefix in the format string, the secret in the args
+    ("plex token: %s", (SECRET,), None, f"plex token: {REDACTED}"),
+    ("apikey=%s", (SECRET,), None, f"apikey={REDACTED}"),
+    # arguments that aren't secrets are formatted as usual
+    ("saving %s under config_name: %s", ("plex", "demo"), None, "saving plex"),
+    ("%d sections", (3,), None, "3 sections"),
+    # a secret inside an argument
+    (
+        "Error validating Tautulli connection: %s",
+        (f"401 for url: http://tautulli:8181/api/v2?apikey={SECRET}&cmd=x",),
+        None,
+        f"apikey={REDACTED}",
+    ),
+    # structured fields are masked by key
+    ("Discovered Plex server", (), {"fields": {"token": SECRET}}, "token="),
+]
+
+
+def main():
+    logger = configure_logging()
+    handler = logger.handlers[0]
+    stream = io.StringIO()
+    original = handler.setStream(stream)
+
+    try:
+        check_logger = get_logger("redaction_check")
+        for message, args, extra, expected in CASES:
+            stream.seek(0)
+            stream.truncate()
+            check_logger.warning(message, *args, extra=extra)
+            line = stream.getvalue()
+            if SECRET in line or expected not in line:
+                raise AssertionError(
+                    f"{message!r} % {args!r}: expected {expected!r} in {line!r}"
+                )
+
+        try:
+            raise ValueError(f"token={SECRET}")
+        except ValueError:
+            stream.seek(0)
+            stream.truncate()
+            check_logger.exception("validation failed")
+        if SECRET in stream.getvalue():
+            raise AssertionError("traceback not masked")
+    finally:
+        handler.setStream(original)
+
+    print(f"OK: {len(CASES) + 1} checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Compare the section data format against the pickles it replaced.
+
+Encodes and decodes every section of json-schema/prototype_config.yml (as
+saved by the wizard) plus one large synthetic section, and reports time per
+operation and the stored size for each.
+
+    python scripts/serialization_benchmark.py
+"""
+
+import copy
+import os
+import pickle
+import sys
+import timeit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from ruamel.yaml import YAML
+
+from modules.serialization import decode_section_data, encode_section_data
+
+
+def sample_sections():
+    yaml = YAML(typ="safe", pure=True)
+    with open(os.path.join(ROOT_DIR, "json-schema", "prototype_config.yml")) as file:
+        prototype = yaml.load(file)
+
+    samples = {}
+    for section in ("plex", "tmdb", "settings", "trakt"):
+        samples[section] = {section: prototype[section], "validated": True}
+    samples["large (many libraries)"] = {
+        "libraries": {
+            f"Library {index}": copy.deepcopy(prototype["libraries"]["Movies"])
+            for index in range(50)
+        },
+        "validated": True,
+    }
+    return samples
+
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    print(f"{'section':<24} {'format':<8} {'bytes':>7} {'encode':>10} {'decode':>10}")
+    for section, data in sample_sections().items():
+        pickled = pickle.dumps(data)
+        encoded = encode_section_data(data)
+        assert decode_section_data(encoded) == data
+        number = 200 if len(pickled) > 10000 else 2000
+
+        for label, blob, encode, decode in (
+            ("pickle", pickled, pickle.dumps, pickle.loads),
+            ("json", encoded, encode_section_data, decode_section_data),
+        ):
+            encode_us = per_call_us(lambda: encode(data), number)
+            decode_us = per_call_us(lambda: decode(blob), number)
+            print(
+                f"{section:<24} {label:<8} {len(blob):>7} "
+                f"{encode_us:>8.1f}us {decode_us:>8.1f}us"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Measure how long a fresh interpreter takes to import app.py.
+
+Each run starts a new `python -X importtime -c "import app"` and reads the
+cumulative import time of `app` from its report; the median of the runs is
+compared against the budget recorded in startup_budget.json.
+
+    python scripts/startup_benchmark.py            # fail if over budget
+    python scripts/startup_benchmark.py --record   # record the current median
+
+It also fails if any of the dependencies that are meant to be imported lazily
+show up during startup.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "startup_budget.json"
+)
+
+# These are only needed by a handful of routes
+DEFERRED_MODULES = [
+    "plexapi",
+    "pyfiglet",
+    "jsonschema",
+    "namesgenerator",
+    "iso639",
+    "iso3166",
+    "modules.validations",
+]
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def measure_once():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing app failed:\n{result.stderr}")
+
+    app_us = None
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, _, name = match.groups()
+        modules[name] = int(self_us)
+        if name == "app":
+            app_us = int(cumulative_us)
+
+    if app_us is None:
+        raise SystemExit("No import time reported for app")
+
+    return app_us / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="write the measured median as the new budget",
+    )
+    args = parser.parse_args()
+
+    # the first import after a change pays for writing .pyc files
+    measure_once()
+
+    timings = []
+    modules = {}
+    for _ in range(args.runs):
+        elapsed_ms, modules = measure_once()
+        timings.append(elapsed_ms)
+
+    median_ms = statistics.median(timings)
+    print(
+        f"import app: median {median_ms:.1f} ms over {args.runs} runs "
+        f"(min {min(timings):.1f}, max {max(timings):.1f})"
+    )
+
+    slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:10]
+    print("slowest modules (self time):")
+    for name, self_us in slowest:
+        print(f"  {self_us / 1000:7.1f} ms  {name}")
+
+    eager = [
+        name
+        for name in DEFERRED_MODULES
+        if any(module == name or module.startswith(name + ".") for module in modules)
+    ]
+
+    if args.record:
+        budget = {"import_ms": round(median_ms, 1), "tolerance": 0.25}
+        with open(BUDGET_PATH, "w") as file:
+            json.dump(budget, file, indent=2)
+            file.write("\n")
+        print(f"recorded budget: {budget}")
+        return 0
+
+    failed = False
+    if eager:
+        print(f"FAIL: imported at startup but should be deferred: {', '.join(eager)}")
+        failed = True
+
+    with open(BUDGET_PATH, "r") as file:
+        budget = json.load(file)
+    limit_ms = budget["import_ms"] * (1 + budget["tolerance"])
+    if median_ms > limit_ms:
+        print(
+            f"FAIL: {median_ms:.1f} ms is over the budget of {budget['import_ms']} ms "
+            f"(+{budget['tolerance']:.0%} = {limit_ms:.1f} ms)"
+        )
+        failed = True
+    else:
+        print(f"OK: within {limit_ms:.1f} ms budget")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
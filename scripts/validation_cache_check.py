@@ -0,0 +1,100 @@
+"""
+Check that a negative validation served from the cache reads like the live one.
+
+Runs the Plex, Radarr and Tautulli validators twice against a local server
+that rejects every request with a 401: the first result is live, the second
+comes from the validation cache. The cached message must match the live one,
+less any credentials it quoted. Uses a throwaway database.
+
+    python scripts/validation_cache_check.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from flask import Flask
+
+from modules import database
+from modules.logs import configure_logging
+from modules.migrations import migrate_database
+
+SECRET = "s3cr3t-key-1234"
+
+
+class Unauthorized(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b"Unauthorized"
+        self.send_response(401)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def validate_twice(validator, data):
+    first = validator(data)
+    live = (first[0] if isinstance(first, tuple) else first).get_json()
+    cached_response, _ = validator(data)
+    return live, cached_response.get_json()
+
+
+def main():
+    # the validators log each failure; only the outcome matters here
+    configure_logging("CRITICAL")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Unauthorized)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE_PATH = os.path.join(tmp, "quickstart.sqlite")
+        migrate_database()
+
+        from modules.validations import (
+            validate_plex_server,
+            validate_radarr_server,
+            validate_tautulli_server,
+        )
+
+        cases = [
+            (validate_plex_server, {"plex_url": base_url, "plex_token": SECRET}),
+            (validate_radarr_server, {"radarr_url": base_url, "radarr_token": SECRET}),
+            (
+                validate_tautulli_server,
+                {"tautulli_url": base_url, "tautulli_apikey": SECRET},
+            ),
+        ]
+
+        app = Flask(__name__)
+        with app.app_context():
+            for validator, data in cases:
+                live, cached = validate_twice(validator, data)
+                if live.get("valid"):
+                    raise AssertionError(f"{validator.__name__}: expected a failure")
+
+                live_message = live.get("error") or live.get("message")
+                cached_message = cached.get("error") or cached.get("message")
+                # Tautulli sends its key in the query string, which isn't kept
+                expected = live_message.replace(
+                    f"?apikey={SECRET}&cmd=get_tautulli_info", ""
+                )
+
+                if SECRET in cached_message or cached_message != expected:
+                    raise AssertionError(
+                        f"{validator.__name__}: live {live_message!r}, "
+                        f"cached {cached_message!r}"
+                    )
+
+    server.shutdown()
+    print(f"OK: {len(cases)} checks passed")
+
+
+if __name__ == "__main__":
+    main()
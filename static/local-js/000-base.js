@@ -73,4 +73,37 @@ function jumpTo (targetPage) {
     console.error('Error during form submission:', error)
   })
 }
+
+// Validations run as background jobs: the POST queues one and returns its
+// status URL, which is polled until the job finishes. Resolves with a
+// Response carrying the validator's own result and status, so callers can
+// treat it exactly like the response of a plain fetch.
+function fetchValidation (url, options) {
+  return fetch(url, options)
+    .then(response => response.json().then(job => {
+      if (!job.job_id) {
+        // turned away (e.g. too many validations in progress)
+        return validationResponse(job, response.status)
+      }
+      return pollValidationJob(job.status_url, 250)
+    }))
+}
+
+function pollValidationJob (statusUrl, delay) {
+  return new Promise(resolve => setTimeout(resolve, delay))
+    .then(() => fetch(statusUrl))
+    .then(response => response.json().then(job => {
+      if (job.status === 'pending' || job.status === 'running') {
+        return pollValidationJob(statusUrl, Math.min(delay * 1.5, 2000))
+      }
+      return validationResponse(job.result || job, job.status_code || response.status)
+    }))
+}
+
+function validationResponse (body, status) {
+  return new Response(JSON.stringify(body), {
+    status,
+    headers: { 'Content-Type': 'application/json' }
+  })
+}
 /* eslint-enable no-unused-vars */
@@ -1,4 +1,4 @@
-/* global $, validateButton, showSpinner, hideSpinner */
+/* global $, validateButton, showSpinner, hideSpinner, fetchValidation */
 
 $(document).ready(function () {
   const validateButton = document.getElementById('validateButton')
@@ -55,7 +55,7 @@ document.getElementById('validateButton').addEventListener('click', function ()
   showSpinner('validate')
   validateButton.disabled = true
 
-  fetch('/validate_plex', {
+  fetchValidation('/validate_plex', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
@@ -85,10 +85,11 @@ document.getElementById('validateButton').addEventListener('click', function ()
 
         // Update the input field to match the server's db_cache value
         document.getElementById('plex_db_cache').value = serverDbCache
-        document.getElementById('tmp_user_list').value = data.user_list
         document.getElementById('tmp_music_libraries').value = data.music_libraries
         document.getElementById('tmp_movie_libraries').value = data.movie_libraries
         document.getElementById('tmp_show_libraries').value = data.show_libraries
+
+        loadPlexUsers(plexUrl, plexToken)
       } else {
         hideSpinner('validate')
         validateButton.disabled = false
@@ -107,3 +108,26 @@ document.getElementById('validateButton').addEventListener('click', function ()
       statusMessage.style.display = 'block'
     })
 })
+
+// The user list comes from plex.tv rather than the server, so it is loaded
+// once the server has validated and never holds up (or fails) validation
+function loadPlexUsers (plexUrl, plexToken) {
+  fetchValidation('/plex_users', {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json'
+    },
+    body: JSON.stringify({ plex_url: plexUrl, plex_token: plexToken })
+  })
+    .then(response => response.json())
+    .then(data => {
+      if (data.valid) {
+        document.getElementById('tmp_user_list').value = data.user_list
+      } else {
+        console.error('Unable to load Plex users:', data.error)
+      }
+    })
+    .catch(error => {
+      console.error('Error loading Plex users:', error)
+    })
+}
@@ -1,4 +1,4 @@
-/* global $, showSpinner, hideSpinner */
+/* global $, showSpinner, hideSpinner, fetchValidation */
 
 $(document).ready(function () {
   const isValidated = document.getElementById('tmdb_validated').value.toLowerCase()
@@ -29,7 +29,7 @@ $(document).ready(function () {
 
     showSpinner('validate')
 
-    fetch('/validate_tmdb', {
+    fetchValidation('/validate_tmdb', {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json'
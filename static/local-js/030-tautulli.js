@@ -1,4 +1,4 @@
-/* global $, showSpinner, hideSpinner */
+/* global $, showSpinner, hideSpinner, fetchValidation */
 
 $(document).ready(function () {
   const isValidated = document.getElementById('tautulli_validated').value.toLowerCase()
@@ -42,7 +42,7 @@ document.getElementById('validateButton').addEventListener('click', function ()
     return
   }
   showSpinner('validate')
-  fetch('/validate_tautulli', {
+  fetchValidation('/validate_tautulli', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
@@ -1,4 +1,4 @@
-/* global $, showSpinner, hideSpinner */
+/* global $, showSpinner, hideSpinner, fetchValidation */
 
 $(document).ready(function () {
   const isValidated = document.getElementById('github_validated').value.toLowerCase() === 'true'
@@ -38,7 +38,7 @@ document.getElementById('validateButton').addEventListener('click', function ()
 
   showSpinner('validate')
 
-  fetch('/validate_github', {
+  fetchValidation('/validate_github', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
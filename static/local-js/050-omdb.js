@@ -1,4 +1,4 @@
-/* global $, showSpinner, hideSpinner */
+/* global $, showSpinner, hideSpinner, fetchValidation */
 
 $(document).ready(function () {
   const isValidated = document.getElementById('omdb_validated').value.toLowerCase()
@@ -38,7 +38,7 @@ document.getElementById('validateButton').addEventListener('click', function ()
 
   showSpinner('validate')
 
-  fetch('/validate_omdb', {
+  fetchValidation('/validate_omdb', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
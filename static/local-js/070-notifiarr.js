@@ -1,4 +1,4 @@
-/* global $, validateButton, showSpinner, hideSpinner */
+/* global $, validateButton, showSpinner, hideSpinner, fetchValidation */
 
 $(document).ready(function () {
   const isValidated = document.getElementById('notifiarr_validated').value.toLowerCase()
@@ -21,7 +21,7 @@ $(document).ready(function () {
 async function validateNotifiarrApikey (apikey) {
   showSpinner('validate')
   const apiUrl = '/validate_notifiarr'
-  const response = await fetch(apiUrl, {
+  const response = await fetchValidation(apiUrl, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
@@ -1,4 +1,4 @@
-/* global $, showSpinner, hideSpinner */
+/* global $, showSpinner, hideSpinner, fetchValidation */
 
 $(document).ready(function () {
   const isValidated = document.getElementById('gotify_validated').value.toLowerCase()
@@ -68,7 +68,7 @@ document.getElementById('validateButton').addEventListener('click', function ()
 
   showSpinner('validate')
 
-  fetch('/validate_gotify', {
+  fetchValidation('/validate_gotify', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
@@ -1,4 +1,4 @@
-/* global $ */
+/* global $, fetchValidation */
 
 const validatedWebhooks = {}
 
@@ -85,7 +85,7 @@ function validateWebhook (webhookType) {
   validationMessage.html('<div class="alert alert-info" role="alert">Validating...</div>')
   validationMessage.show()
 
-  fetch('/validate_webhook', {
+  fetchValidation('/validate_webhook', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
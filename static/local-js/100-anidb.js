@@ -1,4 +1,4 @@
-/* global $, showSpinner, hideSpinner */
+/* global $, showSpinner, hideSpinner, fetchValidation */
 
 $(document).ready(function () {
   const isValidated = document.getElementById('anidb_validated').value.toLowerCase()
@@ -41,7 +41,7 @@ document.getElementById('validateButton').addEventListener('click', function ()
   }
 
   showSpinner('validate')
-  fetch('/validate_anidb', {
+  fetchValidation('/validate_anidb', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
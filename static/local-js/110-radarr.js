@@ -1,4 +1,4 @@
-/* global $, initialRadarrRootFolderPath, initialRadarrQualityProfile, showSpinner, hideSpinner */
+/* global $, initialRadarrRootFolderPath, initialRadarrQualityProfile, showSpinner, hideSpinner, fetchValidation */
 
 $(document).ready(function () {
   const isValidated = document.getElementById('radarr_validated').value.toLowerCase()
@@ -37,7 +37,7 @@ function validateRadarrApi () {
 
   showSpinner('validate')
 
-  fetch('/validate_radarr', {
+  fetchValidation('/validate_radarr', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
@@ -50,6 +50,11 @@ function validateRadarrApi () {
         hideSpinner('validate')
         document.getElementById('radarr_validated').value = 'true'
         statusMessage.textContent = 'Radarr API key is valid.'
+        if (data.errors && Object.keys(data.errors).length > 0) {
+          // the key is good but some lists could not be loaded
+          statusMessage.textContent += ' Could not load: ' + Object.keys(data.errors).join(', ')
+          console.log('Radarr partial failure:', data.errors)
+        }
         statusMessage.style.color = '#75b798'
         statusMessage.style.display = 'block'
         document.getElementById('validateButton').disabled = true
@@ -79,7 +84,7 @@ function fetchDropdownData () {
   const radarr_url = document.getElementById('radarr_url').value
   const radarr_token = document.getElementById('radarr_token').value
 
-  fetch('/validate_radarr', {
+  fetchValidation('/validate_radarr', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
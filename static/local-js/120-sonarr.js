@@ -1,4 +1,4 @@
-/* global $, initialSonarrRootFolderPath, initialSonarrQualityProfile, initialSonarrLanguageProfile, showSpinner, hideSpinner */
+/* global $, initialSonarrRootFolderPath, initialSonarrQualityProfile, initialSonarrLanguageProfile, showSpinner, hideSpinner, fetchValidation */
 
 $(document).ready(function () {
   const isValidated = document.getElementById('sonarr_validated').value.toLowerCase()
@@ -37,7 +37,7 @@ function validateSonarrApi () {
 
   showSpinner('validate')
 
-  fetch('/validate_sonarr', {
+  fetchValidation('/validate_sonarr', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
@@ -50,6 +50,11 @@ function validateSonarrApi () {
         hideSpinner('validate')
         document.getElementById('sonarr_validated').value = 'true'
         statusMessage.textContent = 'Sonarr API key is valid.'
+        if (data.errors && Object.keys(data.errors).length > 0) {
+          // the key is good but some lists could not be loaded
+          statusMessage.textContent += ' Could not load: ' + Object.keys(data.errors).join(', ')
+          console.log('Sonarr partial failure:', data.errors)
+        }
         statusMessage.style.color = '#75b798'
         statusMessage.style.display = 'block'
         document.getElementById('validateButton').disabled = true
@@ -80,7 +85,7 @@ function fetchDropdownData () {
   const sonarr_url = document.getElementById('sonarr_url').value
   const sonarr_token = document.getElementById('sonarr_token').value
 
-  fetch('/validate_sonarr', {
+  fetchValidation('/validate_sonarr', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
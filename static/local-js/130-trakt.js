@@ -1,4 +1,4 @@
-/* global $, showSpinner, hideSpinner */
+/* global $, showSpinner, hideSpinner, fetchValidation */
 
 $(document).ready(function () {
   const isValidated = document.getElementById('trakt_validated').value
@@ -74,7 +74,7 @@ document.getElementById('validate_trakt_pin').addEventListener('click', function
   }
   showSpinner('validate')
   hideSpinner('retrieve')
-  fetch('/validate_trakt', {
+  fetchValidation('/validate_trakt', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
@@ -1,4 +1,4 @@
-/* global $, showSpinner, hideSpinner */
+/* global $, showSpinner, hideSpinner, fetchValidation */
 
 $(document).ready(function () {
   const isValidated = document.getElementById('mal_validated').value
@@ -82,7 +82,7 @@ document.getElementById('validate_mal_url').addEventListener('click', function (
 
   showSpinner('validate')
   hideSpinner('retrieve')
-  fetch('/validate_mal', {
+  fetchValidation('/validate_mal', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json'
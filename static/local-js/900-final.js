@@ -49,6 +49,17 @@ $(document).ready(function () {
   // console.log("Validation Messages:", $('#validation-messages').html());
 })
 
+// Every header style is rendered up front; swap them in place
+const yamlVariants = JSON.parse(document.getElementById('yaml-variants').textContent)
+
 document.getElementById('header-style').addEventListener('change', function () {
-  document.getElementById('final-form').submit()
+  const style = this.value
+  document.getElementById('final-yaml').value = yamlVariants[style]
+
+  const downloadBtn = document.getElementById('download-btn')
+  if (downloadBtn) {
+    const url = new URL(downloadBtn.href, window.location.href)
+    url.searchParams.set('style', style)
+    downloadBtn.href = url.toString()
+  }
 })